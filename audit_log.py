@@ -0,0 +1,190 @@
+import asyncio
+import os
+import sqlite3
+import time
+import traceback
+from typing import List, Optional, Tuple
+
+from utils import storage
+
+# How long audit entries are kept, and how often buffered entries are written.
+AUDIT_RETENTION_DAYS = float(os.getenv("AUDIT_RETENTION_DAYS", "90"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+# A buffer this large is written straight away instead of waiting.
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+PRUNE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    action TEXT NOT NULL,
+    actor_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    target_name TEXT NOT NULL,
+    role_id INTEGER,
+    role_name TEXT,
+    details TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audit_target ON audit_log (guild_id, target_id, created_at);
+CREATE INDEX IF NOT EXISTS audit_role ON audit_log (guild_id, role_id, created_at) WHERE role_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS audit_role_name ON audit_log (guild_id, role_name, created_at) WHERE role_name IS NOT NULL;
+CREATE INDEX IF NOT EXISTS audit_time ON audit_log (created_at);
+"""
+
+Entry = Tuple[int, float, str, int, int, str, Optional[int], Optional[str], str]
+
+
+class AuditLog:
+    """Write-behind moderation audit log in SQLite.
+
+    record() only appends to an in-memory buffer, so command handlers never
+    wait on the disk. A background task writes the buffer in one transaction
+    every AUDIT_FLUSH_INTERVAL seconds (sooner once AUDIT_BATCH_SIZE entries
+    are waiting) on its own connection in a worker thread, and prunes entries
+    older than AUDIT_RETENTION_DAYS about once an hour. Queries flush first
+    so they always see their own writes, and stop() writes the rest on
+    shutdown.
+    """
+
+    def __init__(self, retention_days: float = AUDIT_RETENTION_DAYS):
+        self.retention = retention_days * 86400
+        self._buffer: List[Entry] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._last_prune = 0.0
+        self._stopped = False
+
+    def start(self) -> None:
+        """Start the background writer. Idempotent."""
+        if self._task is not None:
+            return
+        storage.ensure_schema(SCHEMA)
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer and write whatever is still buffered.
+
+        Entries recorded afterwards are written straight away.
+        """
+        if self._task is None:
+            return
+        # While the lock is held no write is running on the writer connection
+        async with self._flush_lock:
+            self._task.cancel()
+        self._task = None
+        self._stopped = True
+        try:
+            await self.flush()
+        except sqlite3.Error:
+            print(f"Writing the audit log failed, {len(self._buffer)} entries lost:")
+            traceback.print_exc()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def record(self, guild_id: int, action: str, actor_id: int, target_id: int, target_name: str,
+               role_id: Optional[int] = None, role_name: Optional[str] = None, details: str = "") -> None:
+        """Queue an audit entry. `target_id` is the member (or role) acted on."""
+        entry = (guild_id, time.time(), action, actor_id, target_id, str(target_name), role_id, role_name, details)
+        if self._stopped:
+            # Shutting down: nothing will flush the buffer any more
+            try:
+                self._insert([entry], storage.get_connection())
+            except sqlite3.Error:
+                print("Writing the audit log failed:")
+                traceback.print_exc()
+            return
+        self._buffer.append(entry)
+        if len(self._buffer) >= AUDIT_BATCH_SIZE and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            entries, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._insert, entries)
+            except sqlite3.Error:
+                self._buffer[:0] = entries  # Keep them for the next attempt
+                raise
+
+    def _connection(self) -> sqlite3.Connection:
+        # Only ever used by one worker thread at a time, never on the loop.
+        if self._writer is None:
+            self._writer = sqlite3.connect(storage.DB_PATH, check_same_thread=False, isolation_level=None)
+            self._writer.execute("PRAGMA busy_timeout=5000")
+        return self._writer
+
+    def _insert(self, entries: List[Entry], conn: Optional[sqlite3.Connection] = None) -> None:
+        if conn is None:
+            conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO audit_log (guild_id, created_at, action, actor_id, target_id, target_name, "
+                "role_id, role_name, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                entries,
+            )
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _prune(self) -> int:
+        cursor = self._connection().execute("DELETE FROM audit_log WHERE created_at < ?",
+                                            (time.time() - self.retention,))
+        return cursor.rowcount
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=AUDIT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if time.time() - self._last_prune >= PRUNE_INTERVAL:
+                    self._last_prune = time.time()
+                    async with self._flush_lock:
+                        pruned = await asyncio.to_thread(self._prune)
+                    if pruned:
+                        print(f"Pruned {pruned} audit log entries older than {self.retention / 86400:g} days")
+            except sqlite3.Error:
+                print("Writing the audit log failed:")
+                traceback.print_exc()
+
+    async def for_target(self, guild_id: int, target_id: int, limit: int = 15) -> List[sqlite3.Row]:
+        """Newest entries about a member (or a role acted on directly)."""
+        await self.flush()
+        return storage.get_connection().execute(
+            "SELECT * FROM audit_log WHERE guild_id = ? AND target_id = ? ORDER BY created_at DESC LIMIT ?",
+            (guild_id, target_id, limit),
+        ).fetchall()
+
+    async def for_role(self, guild_id: int, role_id: Optional[int], role_name: str,
+                       limit: int = 15) -> List[sqlite3.Row]:
+        """Newest entries involving a role, by id, or by name for roles since deleted."""
+        await self.flush()
+        conn = storage.get_connection()
+        if role_id is not None:
+            return conn.execute(
+                "SELECT * FROM audit_log WHERE guild_id = ? AND role_id = ? ORDER BY created_at DESC LIMIT ?",
+                (guild_id, role_id, limit),
+            ).fetchall()
+        return conn.execute(
+            "SELECT * FROM audit_log WHERE guild_id = ? AND role_name = ? ORDER BY created_at DESC LIMIT ?",
+            (guild_id, role_name, limit),
+        ).fetchall()
+
+
+audit_log = AuditLog()
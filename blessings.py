@@ -0,0 +1,88 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from utils import role_cache
+
+# (permission flag, what the blessing lets the member do)
+BLESSINGS: List[Tuple[str, str]] = [
+    ("attach_files", "share sacred scrolls"),
+    ("mention_everyone", "call upon all believers"),
+    ("manage_messages", "moderate divine messages"),
+    ("move_members", "guide lost souls"),
+]
+
+
+def blessing_role_name(blessing: Tuple[str, str]) -> str:
+    return f"Blessed with {blessing[1]}"
+
+
+def _grants(role: discord.Role, blessing: Tuple[str, str]) -> bool:
+    return getattr(role.permissions, blessing[0])
+
+
+class BlessingPool:
+    """One canonical role per blessing and guild, created on first use.
+
+    The canonical role is the oldest role with the blessing's name that
+    grants its permission. It is looked up in role_cache, so blessing a
+    member normally costs a single add-role call. Creation is serialized per
+    guild and blessing, and the created role is remembered until its gateway
+    event reaches the cache, so concurrent blessings never create twice.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+        self._created: Dict[Tuple[int, str], int] = {}
+
+    def roles(self, guild: discord.Guild, blessing: Tuple[str, str]) -> List[discord.Role]:
+        """All roles serving as this blessing, canonical (oldest) first."""
+        roles = [role for role in role_cache.resolve_roles(guild, blessing_role_name(blessing))
+                 if _grants(role, blessing)]
+        return sorted(roles, key=lambda role: role.id)
+
+    def find(self, guild: discord.Guild, blessing: Tuple[str, str]) -> Optional[discord.Role]:
+        roles = self.roles(guild, blessing)
+        if roles:
+            return roles[0]
+        created = self._created.get((guild.id, blessing[0]))
+        return guild.get_role(created) if created is not None else None
+
+    async def get_role(self, guild: discord.Guild, blessing: Tuple[str, str],
+                       reason: Optional[str] = None) -> discord.Role:
+        """The blessing's canonical role, creating it if the guild has none."""
+        role = self.find(guild, blessing)
+        if role is not None:
+            return role
+        key = (guild.id, blessing[0])
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            role = self.find(guild, blessing)
+            if role is None:
+                role = await guild.create_role(
+                    name=blessing_role_name(blessing),
+                    permissions=discord.Permissions(**{blessing[0]: True}),
+                    color=discord.Color.purple(),
+                    reason=reason,
+                )
+                self._created[key] = role.id
+        return role
+
+    def duplicates(self, guild: discord.Guild) -> List[Tuple[discord.Role, List[discord.Role]]]:
+        """(canonical role, duplicates) for every blessing with more than one role."""
+        result = []
+        for blessing in BLESSINGS:
+            roles = self.roles(guild, blessing)
+            if len(roles) > 1:
+                result.append((roles[0], roles[1:]))
+        return result
+
+    def drop_guild(self, guild_id: int) -> None:
+        for key in [key for key in self._created if key[0] == guild_id]:
+            del self._created[key]
+        for key in [key for key in self._locks if key[0] == guild_id]:
+            del self._locks[key]
+
+
+blessing_pool = BlessingPool()
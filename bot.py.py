@@ -1,14 +1,38 @@
 import discord
 import os
 from discord.ext import commands
+from discord import app_commands
 import random
-from typing import Optional
+import re
+import shlex
+from typing import List, Optional
 from dotenv import load_dotenv
-from utils.role_helpers import parse_color, parse_permissions, format_role_info, role_templates, get_template_info
+from utils.role_helpers import parse_color, parse_permissions, format_role_info, role_templates
+from utils.role_helpers import UnknownPermissionError
 import asyncio
 from datetime import datetime, timedelta
 from utils.role_helpers import has_role_permission, get_role_commands_info
+from utils import role_cache, member_cache, role_search, warm_state
+from utils.fanout import fan_out, can_post, SKIPPED
+from utils.bulk_roles import resolve_targets, split_by_state, BULK_USAGE
+from utils.moderation import split_reason, filter_targets, ban_members, kick_members
+from utils.ratelimit import BucketLimiter, outbound, set_request_context, MODERATION, ROLE_EDITS, BROADCAST
+from utils.scheduler import scheduler
+from utils.jobs import job_queue
+from utils.coalesce import role_edits
+from utils.role_history import role_history
+from utils.audit_log import audit_log
+from utils.template_store import template_store
+from utils.role_positions import plan_move, parse_move_direction, PositionError
+from utils.provisioning import load_manifest, plan_provision, apply_plan, ManifestError
+from utils.snapshots import (take_snapshot, load_snapshot, plan_restore, apply_restore, save_snapshot_file,
+                             latest_snapshot_file, SnapshotError, SNAPSHOT_DIR)
+from utils.role_helpers import split_duration_suffix, parse_duration
+from utils.blessings import BLESSINGS, blessing_pool
+from utils import metrics
+from utils.cluster import SHARD_MODE, CLUSTER_ID, shard_options, owns_guild
 from keep_alive import keep_alive # Added import statement
+import keep_alive as keep_alive_server
 
 # Load environment variables
 load_dotenv()
@@ -17,22 +41,184 @@ load_dotenv()
 intents = discord.Intents.default()
 intents.guilds = True
 intents.guild_messages = True
-intents.message_content = True
+# MESSAGE_CONTENT_INTENT=0 runs without the privileged intent: slash commands
+# and "@Bot command" still work, "!command" does not.
+intents.message_content = os.getenv("MESSAGE_CONTENT_INTENT", "1") == "1"
 intents.members = True
+command_prefix = commands.when_mentioned_or("!")
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-last_created_role = {}
+bot_options = {**member_cache.bot_options(), **warm_state.bot_options()}
+
+class CleanShutdown:
+    """Interrupts jobs and timers (kept on disk for the next start), disconnects,
+    then writes the buffered audit entries last."""
+
+    async def close(self):
+        await job_queue.stop()
+        await scheduler.stop()
+        await super().close()
+        await audit_log.stop()
+
+class RoleBot(CleanShutdown, commands.Bot):
+    pass
+
+class ShardedRoleBot(CleanShutdown, commands.AutoShardedBot):
+    pass
+
+if SHARD_MODE == "single":
+    bot = RoleBot(command_prefix=command_prefix, intents=intents, **bot_options)
+else:
+    bot = ShardedRoleBot(command_prefix=command_prefix, intents=intents, **bot_options, **shard_options())
+loop_monitor = None
+warm_state_task = None
+metrics.gateway_latency.fn = lambda: bot.latency
+
+def collect_shard_latencies():
+    for shard_id, latency in getattr(bot, "latencies", []):
+        metrics.shard_latency.set(latency, shard=shard_id)
+
+metrics.register_collector(collect_shard_latencies)
+
+# Discord allows 5 messages per 5 seconds in each channel.
+channel_limiter = BucketLimiter(5, 5)
+# Member role edits share one bucket per guild.
+member_limiter = BucketLimiter(float(os.getenv("MEMBER_EDIT_RATE", "5")), 1)
+# Role creates and edits share one bucket per guild.
+role_limiter = BucketLimiter(float(os.getenv("ROLE_EDIT_RATE", "2")), 1)
+# The global limit is enforced for every HTTP request by ratelimit.outbound,
+# which serves moderation first, then role edits, then broadcasts.
+COMMAND_PRIORITIES = {
+    "knightmute": MODERATION,
+    "kingexile": MODERATION,
+    "kingexilemany": MODERATION,
+    "kingrename": MODERATION,
+    "godsmite": MODERATION,
+    "godsmitemany": MODERATION,
+    "knightannounce": BROADCAST,
+    "kingdecree": BROADCAST,
+    "godspeak": BROADCAST,
+}
+
+@bot.event
+async def setup_hook():
+    if warm_state.WARM_START:
+        warm_state.load_all(guild_filter=owns_guild)
+    # Syncing is rate limited, so only do it when asked (after commands change)
+    # and only from one process.
+    if os.getenv("SYNC_COMMANDS", "0") == "1" and not CLUSTER_ID:
+        synced = await bot.tree.sync()
+        print(f"Synced {len(synced)} slash commands")
 
 @bot.event
 async def on_ready():
+    for guild in bot.guilds:
+        role_cache.build_guild_index(guild)
+    scheduler.start(guild_filter=owns_guild)
+    job_queue.start(bot, guild_filter=owns_guild)
+    audit_log.start()
+    metrics.instrument_http(bot.http)
+    outbound.install(bot.http)
+    global loop_monitor, warm_state_task
+    if loop_monitor is None:
+        loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    if warm_state.WARM_START and warm_state_task is None:
+        warm_state_task = asyncio.create_task(warm_state.run(bot))
     print(f'Logged in as {bot.user}')
 
-@bot.command(name="createrole")
+@bot.before_invoke
+async def set_command_priority(ctx):
+    priority = COMMAND_PRIORITIES.get(ctx.command.qualified_name, ROLE_EDITS)
+    set_request_context(priority, ctx.guild.id if ctx.guild else None)
+
+@bot.event
+async def on_command(ctx):
+    metrics.command_started(ctx)
+
+@bot.event
+async def on_command_completion(ctx):
+    metrics.command_finished(ctx, "ok")
+
+async def expire_mute(payload):
+    guild = bot.get_guild(payload["guild_id"])
+    if guild is None:
+        return
+    set_request_context(MODERATION, guild.id)
+    try:
+        member = await member_cache.get_member(guild, payload["member_id"])
+        await member.edit(mute=False)
+    except discord.NotFound:
+        return
+    channel = guild.get_channel(payload["channel_id"])
+    if channel is not None:
+        await channel.send(f"🔊 {member.mention} has been unmuted")
+
+async def expire_role(payload):
+    guild = bot.get_guild(payload["guild_id"])
+    if guild is None:
+        return
+    role = guild.get_role(payload["role_id"])
+    if role is None:
+        return
+    try:
+        member = await member_cache.get_member(guild, payload["member_id"])
+        await role_edits.remove(member, role, reason="Temporary role expired")
+    except discord.NotFound:
+        return
+    channel = guild.get_channel(payload["channel_id"])
+    if channel is not None:
+        await channel.send(f"⌛ {member.mention}'s temporary role {role.name} has expired")
+
+scheduler.register("unmute", expire_mute)
+scheduler.register("remove_role", expire_role)
+
+@bot.event
+async def on_guild_join(guild):
+    role_cache.build_guild_index(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    role_cache.drop_guild(guild.id)
+    role_search.drop_guild(guild.id)
+    warm_state.forget(guild.id)
+    blessing_pool.drop_guild(guild.id)
+
+@bot.event
+async def on_member_join(member):
+    role_cache.add_member(member)
+    member_cache.record_join(member)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    role_cache.forget_member(payload.guild_id, payload.user.id)
+    member_cache.forget_member(payload.guild_id, payload.user.id)
+
+@bot.event
+async def on_member_update(before, after):
+    role_cache.update_member(before, after)
+
+@bot.event
+async def on_guild_role_create(role):
+    role_cache.add_role(role)
+    role_search.add_role(role)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    role_cache.update_role(before, after)
+    role_search.update_role(before, after)
+
+@bot.event
+async def on_guild_role_delete(role):
+    role_cache.remove_role(role)
+    role_search.remove_role(role)
+    role_history.forget(role.guild.id, [role.id])
+
+@bot.hybrid_command(name="createrole")
 @commands.has_permissions(manage_roles=True)
 async def create_role(ctx, name: str, *, args: Optional[str] = ""):
     """Create a new role with specified name, color, and permissions
     Usage: !createrole RoleName color=red perms=kick,ban,manage_messages mentionable=true hoisted=true
     """
+    await ctx.defer()
     guild = ctx.guild
 
     # Parse arguments
@@ -40,11 +226,11 @@ async def create_role(ctx, name: str, *, args: Optional[str] = ""):
 
     # Set up role parameters
     role_color = parse_color(args_dict.get('color', 'default'))
-    permissions = discord.Permissions()
-
-    if 'perms' in args_dict:
-        perm_dict = parse_permissions(args_dict['perms'])
-        permissions.update(**perm_dict)
+    try:
+        permissions = discord.Permissions(parse_permissions(args_dict.get('perms', '')))
+    except UnknownPermissionError as e:
+        await ctx.send(f"{e}. Use permission names like kick, ban, manage_roles, or groups like moderation.")
+        return
 
     mentionable = args_dict.get('mentionable', 'false').lower() == 'true'
     hoisted = args_dict.get('hoisted', 'false').lower() == 'true'
@@ -57,82 +243,221 @@ async def create_role(ctx, name: str, *, args: Optional[str] = ""):
             mentionable=mentionable,
             hoist=hoisted
         )
-        last_created_role[guild.id] = role
+        role_history.record(role, "createrole")
+        audit_log.record(guild.id, "createrole", ctx.author.id, role.id, role.name, role_id=role.id, role_name=role.name)
         await ctx.send(f"Created role {role.mention} successfully!")
     except discord.Forbidden:
         await ctx.send("I don't have permission to create roles!")
     except discord.HTTPException:
         await ctx.send("Failed to create role. Please try again.")
 
-@bot.command(name="roleinfo")
+async def role_not_found(ctx, role_name: str):
+    suggestions = role_search.suggest(ctx.guild, role_name)
+    hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+    await ctx.send(f"Role '{role_name}' not found!{hint}")
+
+@bot.hybrid_command(name="roleinfo")
 async def role_info(ctx, *, role_name: str):
     """Display detailed information about a role
     Usage: !roleinfo RoleName
     """
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
+    await ctx.defer()
+    role = role_cache.resolve_role(ctx.guild, role_name)
     if not role:
-        await ctx.send(f"Role '{role_name}' not found!")
+        await role_not_found(ctx, role_name)
         return
 
-    await ctx.send(f"```\n{format_role_info(role)}\n```")
+    await role_cache.ensure_member_index(ctx.guild)
+    info = format_role_info(role, role_cache.member_count(ctx.guild, role.id))
+    age = role_cache.warm_age(ctx.guild.id)
+    if age is not None:
+        info += f"\n\n(Member count from a snapshot {age / 60:.0f} minutes old, still syncing)"
+    await ctx.send(f"```\n{info}\n```")
 
-@bot.command(name="deleterole")
+@bot.hybrid_command(name="deleterole")
 @commands.has_permissions(manage_roles=True)
 async def delete_role(ctx, *, role_name: str):
     """Delete a role
     Usage: !deleterole RoleName
     """
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
+    role = role_cache.resolve_role(ctx.guild, role_name)
     if not role:
-        await ctx.send(f"Role '{role_name}' not found!")
+        await role_not_found(ctx, role_name)
         return
 
     try:
         await role.delete()
+        audit_log.record(ctx.guild.id, "deleterole", ctx.author.id, role.id, role.name, role_id=role.id, role_name=role.name)
         await ctx.send(f"Deleted role '{role_name}' successfully!")
     except discord.Forbidden:
         await ctx.send("I don't have permission to delete this role!")
     except discord.HTTPException:
         await ctx.send("Failed to delete role. Please try again.")
 
-@bot.command(name="assignrole")
+@bot.hybrid_command(name="assignrole")
 @commands.has_permissions(manage_roles=True)
 async def assign_role(ctx, member: discord.Member, *, role_name: str):
-    """Assign a role to a member
-    Usage: !assignrole @Member RoleName
+    """Assign a role to a member, optionally for a limited time
+    Usage: !assignrole @Member RoleName [for 2h]
     """
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
+    role_name, duration = split_duration_suffix(role_name)
+    role = role_cache.resolve_role(ctx.guild, role_name)
     if not role:
-        await ctx.send(f"Role '{role_name}' not found!")
+        await role_not_found(ctx, role_name)
         return
 
     try:
-        await member.add_roles(role)
-        await ctx.send(f"Assigned role {role.mention} to {member.mention}")
+        await role_edits.add(member, role)
+        audit_log.record(ctx.guild.id, "assignrole", ctx.author.id, member.id, member.name, role_id=role.id,
+                         role_name=role.name, details=f"for {duration}" if duration else "")
+        if duration:
+            scheduler.schedule(
+                "remove_role", duration.total_seconds(), ctx.guild.id,
+                {"guild_id": ctx.guild.id, "member_id": member.id, "role_id": role.id, "channel_id": ctx.channel.id},
+                key=f"remove_role:{ctx.guild.id}:{member.id}:{role.id}",
+            )
+            await ctx.send(f"Assigned role {role.mention} to {member.mention} for {duration}")
+        else:
+            await ctx.send(f"Assigned role {role.mention} to {member.mention}")
     except discord.Forbidden:
         await ctx.send("I don't have permission to assign this role!")
     except discord.HTTPException:
         await ctx.send("Failed to assign role. Please try again.")
 
-@bot.command(name="removerole")
+@bot.hybrid_command(name="removerole")
 @commands.has_permissions(manage_roles=True)
 async def remove_role(ctx, member: discord.Member, *, role_name: str):
     """Remove a role from a member
     Usage: !removerole @Member RoleName
     """
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
+    role = role_cache.resolve_role(ctx.guild, role_name)
     if not role:
-        await ctx.send(f"Role '{role_name}' not found!")
+        await role_not_found(ctx, role_name)
         return
 
     try:
-        await member.remove_roles(role)
+        await role_edits.remove(member, role)
+        audit_log.record(ctx.guild.id, "removerole", ctx.author.id, member.id, member.name, role_id=role.id,
+                         role_name=role.name)
         await ctx.send(f"Removed role {role.mention} from {member.mention}")
     except discord.Forbidden:
         await ctx.send("I don't have permission to remove this role!")
     except discord.HTTPException:
         await ctx.send("Failed to remove role. Please try again.")
 
+def member_name(guild: discord.Guild, member_id: int) -> str:
+    member = guild.get_member(member_id)
+    return member.name if member else str(member_id)
+
+async def bulk_role_change(ctx, role_name: str, targets: str, adding: bool):
+    await ctx.defer()
+    role = role_cache.resolve_role(ctx.guild, role_name)
+    if not role:
+        await role_not_found(ctx, role_name)
+        return
+
+    await role_cache.ensure_member_index(ctx.guild, allow_warm=False)
+    member_ids, dry_run, errors = resolve_targets(ctx, targets)
+    if errors:
+        await ctx.send("\n".join(errors) + f"\n{BULK_USAGE}")
+        return
+    todo, already = split_by_state(ctx.guild, member_ids, role.id, adding)
+    verb = "Assigning" if adding else "Removing"
+    state = "already have it" if adding else "don't have it"
+    plan = f"{verb} {role.name} for {len(todo)} members ({already} {state})"
+    if dry_run or not todo:
+        await ctx.send(f"{plan}{' [dry run]' if dry_run else ''}")
+        return
+
+    params = {
+        "role_id": role.id,
+        "adding": adding,
+        "member_ids": todo,
+        "reason": f"Bulk {'assign' if adding else 'remove'} by {ctx.author.display_name}",
+    }
+    job, created = await job_queue.submit(ctx, "bulkrole", plan, params, dedup=[role.id, adding, sorted(todo)])
+    if not created:
+        await ctx.send(f"The same change is already {job.status} as job #{job.id}.")
+
+async def run_bulk_role(job):
+    guild = bot.get_guild(job.guild_id)
+    role = guild.get_role(job.params["role_id"]) if guild else None
+    if role is None:
+        return "the role no longer exists"
+    adding = job.params["adding"]
+    edit = bot.http.add_role if adding else bot.http.remove_role
+    action = "bulkassignrole" if adding else "bulkremoverole"
+    done = set(job.checkpoint.get("done", []))
+
+    async def apply(member_id):
+        try:
+            await edit(guild.id, member_id, role.id, reason=job.params["reason"])
+        except discord.NotFound:
+            done.add(member_id)
+            return SKIPPED
+        done.add(member_id)
+        audit_log.record(guild.id, action, job.author_id, member_id, member_name(guild, member_id),
+                         role_id=role.id, role_name=role.name, details=f"job #{job.id}")
+        if adding:
+            role_cache.apply_role_delta(guild.id, member_id, added=[role.id])
+        else:
+            role_cache.apply_role_delta(guild.id, member_id, removed=[role.id])
+
+    async def progress(result):
+        job.save(done=sorted(done))
+        await job.report(result.summary())
+
+    result = await fan_out(
+        [member_id for member_id in job.params["member_ids"] if member_id not in done],
+        apply,
+        limiter=member_limiter,
+        bucket_key=lambda member_id: guild.id,
+        on_progress=progress,
+    )
+    return result.summary()
+
+@bot.hybrid_command(name="bulkassignrole")
+@commands.has_permissions(manage_roles=True)
+async def bulk_assign_role(ctx, role_name: str, *, targets: str):
+    """Assign a role to many members at once
+    Usage: !bulkassignrole "Role Name" @user1 @user2 from:"Other Role" match:text [dry-run]
+    """
+    await bulk_role_change(ctx, role_name, targets, adding=True)
+
+@bot.hybrid_command(name="bulkremoverole")
+@commands.has_permissions(manage_roles=True)
+async def bulk_remove_role(ctx, role_name: str, *, targets: str):
+    """Remove a role from many members at once
+    Usage: !bulkremoverole "Role Name" @user1 @user2 from:"Other Role" match:text [dry-run]
+    """
+    await bulk_role_change(ctx, role_name, targets, adding=False)
+
+MOVE_KEYWORDS = ["move", "up", "down", "over", "under", "moveto", "top", "bottom"]
+
+async def apply_role_move(ctx, roles, direction_text):
+    """Plan a move with utils.role_positions and send only the changed positions."""
+    guild = ctx.guild
+    parsed = parse_move_direction(direction_text)
+    if parsed is None:
+        await ctx.send("Invalid command usage.")
+        return False
+    direction, amount, reference_name = parsed
+    reference = None
+    if reference_name:
+        reference = role_cache.resolve_role(guild, reference_name)
+        if not reference:
+            await ctx.send(f'Reference role `{reference_name}` not found.')
+            return False
+
+    try:
+        changes = plan_move(guild.roles, roles, direction, amount, reference, ceiling=guild.me.top_role)
+    except PositionError as e:
+        await ctx.send(str(e))
+        return False
+    if changes:
+        await guild.edit_role_positions(changes)
+    return True
+
 @bot.command(name="moverole")
 @commands.has_permissions(manage_roles=True)
 async def moverole(ctx, *, args: str):
@@ -147,134 +472,436 @@ async def moverole(ctx, *, args: str):
     parts = args.split(" ")
     role_name = ""
     direction = ""
-    amount = None
-    reference_role = None
 
     for i, part in enumerate(parts):
-        if part.lower() in ["move", "up", "down", "over", "under", "moveto", "top", "bottom"]:
+        if part.lower() in MOVE_KEYWORDS:
             direction = " ".join(parts[i:])
             break
         role_name += part + " "
 
     role_name = role_name.strip()
-    if direction.startswith("move over") or direction.startswith("move under"):
-        direction, reference_role = direction.split(" ", 2)[1:]
-    elif direction.startswith("move up") or direction.startswith("move down"):
-        split_dir = direction.split(" ")
-        if len(split_dir) > 2 and split_dir[2].isdigit():
-            amount = int(split_dir[2])
-        direction = split_dir[1]
-    elif direction.startswith("moveto"):
-        reference_role = direction.split(" ")[1]
-        direction = "moveto"
-
     try:
-        guild = ctx.guild
-        role = discord.utils.get(guild.roles, name=role_name)
+        role = role_cache.resolve_role(ctx.guild, role_name)
         if not role:
             await ctx.send(f'Role `{role_name}` not found.')
             return
 
-        roles = guild.roles
-        current_index = roles.index(role)
-
-        if direction == "up" and amount:
-            new_index = max(1, current_index - amount)
-        elif direction == "down" and amount:
-            new_index = min(len(roles) - 1, current_index + amount)
-        elif direction == "over" and reference_role:
-            ref_role = discord.utils.get(guild.roles, name=reference_role)
-            if not ref_role:
-                await ctx.send(f'Reference role `{reference_role}` not found.')
-                return
-            new_index = roles.index(ref_role) - 1
-        elif direction == "under" and reference_role:
-            ref_role = discord.utils.get(guild.roles, name=reference_role)
-            if not ref_role:
-                await ctx.send(f'Reference role `{reference_role}` not found.')
-                return
-            new_index = roles.index(ref_role) + 1
-        elif direction == "moveto" and reference_role:
-            if reference_role.lower() == "top":
-                new_index = 1
-            elif reference_role.lower() == "bottom":
-                new_index = len(roles) - 1
-            else:
-                await ctx.send("Invalid position! Use `top` or `bottom`.")
-                return
-        else:
-            await ctx.send("Invalid command usage.")
+        if await apply_role_move(ctx, [role], direction):
+            await ctx.send(f'Moved role `{role_name}` successfully.')
+    except discord.Forbidden:
+        await ctx.send("I don't have permission to move roles!")
+    except discord.HTTPException:
+        await ctx.send("Failed to move role. Please try again.")
+
+@bot.command(name="moveroles")
+@commands.has_permissions(manage_roles=True)
+async def moveroles(ctx, *, args: str):
+    """Move several roles at once, keeping their order, in one request
+    Usage:
+    !moveroles Role A, Role B, Role C move under ReferenceName
+    !moveroles Role A, Role B moveto top/bottom
+    """
+    match = re.match(r'^(.+?)\s+((?:move\s+)?(?:up|down|over|under)\b.*|moveto\s+\S+)$', args.strip(), re.IGNORECASE)
+    if not match:
+        await ctx.send("Invalid command usage.")
+        return
+
+    roles = []
+    for role_name in (name.strip() for name in match.group(1).split(",")):
+        if not role_name:
+            continue
+        role = role_cache.resolve_role(ctx.guild, role_name)
+        if not role:
+            await ctx.send(f'Role `{role_name}` not found.')
             return
+        roles.append(role)
 
-        new_roles = roles[:]
-        new_roles.pop(current_index)
-        new_roles.insert(new_index, role)
-        await guild.edit_role_positions({r: i for i, r in enumerate(new_roles)})
-        await ctx.send(f'Moved role `{role_name}` successfully.')
+    try:
+        if await apply_role_move(ctx, roles, match.group(2)):
+            await ctx.send(f'Moved {len(roles)} roles successfully.')
     except discord.Forbidden:
         await ctx.send("I don't have permission to move roles!")
     except discord.HTTPException:
-        await ctx.send("Failed to move role. Please try again.")
+        await ctx.send("Failed to move roles. Please try again.")
 
-@bot.command(name="cleanroles")
+@bot.hybrid_command(name="cleanroles")
 @commands.has_permissions(manage_roles=True)
 async def clean_roles(ctx, *, pattern: Optional[str] = None):
     """Delete unused roles or roles matching a pattern
     Usage: !cleanroles [pattern]
+    Patterns match anywhere in the name, glob-style (mod-*) or as re:<regex>
     """
+    await ctx.defer()
     guild = ctx.guild
-    deleted_count = 0
+    if pattern:
+        try:
+            roles = role_search.select(guild, pattern)
+        except re.error as e:
+            await ctx.send(f"Invalid regular expression: {e}")
+            return
+    else:
+        roles = guild.roles[1:]  # Skip @everyone role
+
+    title = f"Cleaning unused roles matching '{pattern}'" if pattern else "Cleaning unused roles"
+    job, created = await job_queue.submit(ctx, "cleanroles", title, {"role_ids": [role.id for role in roles]},
+                                          dedup=(pattern or "").lower())
+    if not created:
+        await ctx.send(f"That cleanup is already {job.status} as job #{job.id}.")
 
-    for role in guild.roles[1:]:  # Skip @everyone role
-        if pattern:
-            if pattern.lower() not in role.name.lower():
-                continue
+async def run_clean_roles(job):
+    guild = bot.get_guild(job.guild_id)
+    if guild is None:
+        return "the server is unavailable"
+    await role_cache.ensure_member_index(guild, allow_warm=False)
+    role_ids = job.params["role_ids"]
+    deleted_count = job.checkpoint.get("deleted", 0)
 
-        if not any(member.roles for member in guild.members if role in member.roles):
+    for index in range(job.checkpoint.get("next", 0), len(role_ids)):
+        role = guild.get_role(role_ids[index])
+        if role is not None and not role_cache.member_count(guild, role.id):
             try:
                 await role.delete()
                 deleted_count += 1
+                audit_log.record(guild.id, "cleanroles", job.author_id, role.id, role.name,
+                                 role_id=role.id, role_name=role.name, details=f"job #{job.id}")
             except (discord.Forbidden, discord.HTTPException):
-                continue
+                pass
+        job.save(next=index + 1, deleted=deleted_count)
+        await job.report(f"checked {index + 1}/{len(role_ids)} roles, deleted {deleted_count}")
 
-    await ctx.send(f"Cleaned up {deleted_count} unused roles!")
+    return f"Cleaned up {deleted_count} unused roles!"
 
-@bot.command(name="createrolepreset")
+@bot.hybrid_command(name="createrolepreset")
 @commands.has_permissions(manage_roles=True)
 async def create_role_preset(ctx, template_name: str, role_name: Optional[str] = None):
-    """Create a role using a predefined template
+    """Create a role using a predefined or server template
     Usage: !createrolepreset template_name [custom_role_name]
-    Available templates: lesser_creature, knight, king, god
+    Available templates: lesser_creature, knight, king, god, plus any added with !addtemplate
     """
+    await ctx.defer()
     template_name = template_name.lower()
-    if template_name not in role_templates:
-        await ctx.send(f"Template '{template_name}' not found!\n\n{get_template_info()}")
+    template = template_store.get_template(ctx.guild.id, template_name)
+    if template is None:
+        await ctx.send(f"Template '{template_name}' not found!\n\n{template_store.template_info(ctx.guild.id)}")
         return
 
-    template = role_templates[template_name]
     name = role_name if role_name else template_name.replace('_', ' ').title()
 
     try:
         role = await ctx.guild.create_role(
             name=name,
             color=template['color'],
-            permissions=discord.Permissions(**template['permissions']),
+            permissions=discord.Permissions(template['permissions']),
             hoist=template['hoist'],
             mentionable=template['mentionable'],
             reason=f"Created using {template_name} template"
         )
 
-        last_created_role[ctx.guild.id] = role
+        role_history.record(role, f"createrolepreset {template_name}")
         await ctx.send(f"Created role {role.mention} using the {template_name} template!\n```\n{format_role_info(role)}\n```")
     except discord.Forbidden:
         await ctx.send("I don't have permission to create roles!")
     except discord.HTTPException:
         await ctx.send("Failed to create role. Please try again.")
 
-@bot.command(name="listtemplates")
+@bot.command(name="provisionroles")
+@commands.has_permissions(manage_roles=True)
+async def provision_roles(ctx, *, args: Optional[str] = ""):
+    """Create, update and order roles from a JSON/YAML manifest
+    Usage: !provisionroles [dry-run] with the manifest attached or in a code block
+    """
+    dry_run = "dry-run" in args.lower()
+    if ctx.message.attachments:
+        text = (await ctx.message.attachments[0].read()).decode("utf-8")
+    else:
+        match = re.search(r"```(?:\w+\n)?(.*?)```", args, re.DOTALL)
+        if not match:
+            await ctx.send("Attach a manifest file or paste it in a code block.")
+            return
+        text = match.group(1)
+
+    try:
+        plan = plan_provision(ctx.guild.roles, load_manifest(text, template_store.get_templates(ctx.guild.id)))
+    except ManifestError as e:
+        await ctx.send(f"Invalid manifest: {e}")
+        return
+    if dry_run:
+        await ctx.send(f"Manifest plan: {plan.summary()} [dry run]")
+        return
+
+    status = await ctx.send(f"Provisioning roles: {plan.summary()}...")
+
+    async def progress(result):
+        await status.edit(content=f"Provisioning roles... {result.summary()}")
+
+    try:
+        result = await apply_plan(ctx.guild, plan, role_limiter, progress,
+                                  reason=f"Role manifest applied by {ctx.author.display_name}")
+        await status.edit(content=f"Provisioned roles: {result.summary()}")
+    except discord.Forbidden:
+        await ctx.send("I don't have permission to reorder roles!")
+    except discord.HTTPException:
+        await ctx.send("Failed to reorder roles. Please try again.")
+
+@bot.command(name="snapshotroles")
+@commands.has_permissions(manage_roles=True)
+async def snapshot_roles(ctx):
+    """Save the server's roles and their members to a snapshot file
+    Usage: !snapshotroles
+    """
+    await role_cache.ensure_member_index(ctx.guild, allow_warm=False)
+    snapshot = take_snapshot(ctx.guild)
+    path = save_snapshot_file(snapshot)
+    try:
+        await ctx.send(f"Saved {snapshot.summary()}. Restore it with !restoreroles.", file=discord.File(path))
+    except discord.HTTPException:
+        await ctx.send(f"Saved {snapshot.summary()} on the bot's host, but could not upload the file.")
+
+@bot.command(name="restoreroles")
+@commands.has_permissions(manage_roles=True)
+async def restore_roles(ctx, *, args: Optional[str] = ""):
+    """Restore roles and their members from a snapshot (attached, or the latest saved one)
+    Usage: !restoreroles [dry-run]
+    """
+    dry_run = "dry-run" in args.lower()
+    if ctx.message.attachments:
+        blob = await ctx.message.attachments[0].read()
+        path = os.path.join(SNAPSHOT_DIR, f"upload-{ctx.guild.id}-{ctx.message.id}.json.gz")
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(blob)
+    else:
+        path = latest_snapshot_file(ctx.guild.id)
+        if path is None:
+            await ctx.send("No saved snapshot for this server. Attach one or take one with !snapshotroles.")
+            return
+        with open(path, "rb") as f:
+            blob = f.read()
+
+    try:
+        snapshot = load_snapshot(blob)
+    except SnapshotError as e:
+        await ctx.send(f"Invalid snapshot: {e}")
+        return
+    await role_cache.ensure_member_index(ctx.guild, allow_warm=False)
+    plan = plan_restore(ctx.guild, snapshot)
+    if dry_run:
+        await ctx.send(f"Restoring {snapshot.summary()}: {plan.summary()} [dry run]")
+        return
+
+    job, created = await job_queue.submit(ctx, "restoreroles", f"Restoring {snapshot.summary()}", {"file": path})
+    if not created:
+        await ctx.send(f"That snapshot is already being restored as job #{job.id}.")
+
+async def run_restore_roles(job):
+    guild = bot.get_guild(job.guild_id)
+    if guild is None:
+        return "the server is unavailable"
+    with open(job.params["file"], "rb") as f:
+        snapshot = load_snapshot(f.read())
+    await role_cache.ensure_member_index(guild, allow_warm=False)
+    # Re-planned on resume: whatever was already restored no longer shows up in the diff.
+    plan = plan_restore(guild, snapshot)
+
+    async def progress(stage, result):
+        await job.report(f"{stage}: {result.summary()}")
+
+    roles_result, members_result = await apply_restore(
+        guild, plan, bot.http, role_limiter, member_limiter, progress,
+        reason=f"Role snapshot restore (job #{job.id})",
+    )
+    return f"Restored roles: {roles_result.summary()}\nRestored members: {members_result.summary()}"
+
+job_queue.register("restoreroles", run_restore_roles)
+
+@bot.command(name="rolehistory")
+@commands.has_permissions(manage_roles=True)
+async def show_role_history(ctx, count: int = 10):
+    """Show the roles most recently created by the bot
+    Usage: !rolehistory [count]
+    """
+    entries = role_history.recent(ctx.guild.id, count)
+    if not entries:
+        await ctx.send("No roles have been created recently.")
+        return
+
+    lines = ["Recently created roles (newest first):"]
+    for i, entry in enumerate(entries, 1):
+        created = datetime.fromtimestamp(entry.created_at).strftime("%Y-%m-%d %H:%M")
+        lines.append(f"{i}. {entry.name} (ID: {entry.role_id}) via {entry.source} at {created}")
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="history")
+@commands.has_permissions(view_audit_log=True)
+async def show_history(ctx, *, target: str):
+    """Show recent moderation and role actions on a member or a role
+    Usage: !history @user | !history 123456789 | !history role RoleName
+    """
+    role_view = target.lower().startswith("role ")
+    if role_view:
+        role_name = target[5:].strip()
+        role = role_cache.resolve_role(ctx.guild, role_name)
+        # Deleted roles can still be looked up by the name they had
+        entries = await audit_log.for_role(ctx.guild.id, role.id if role else None, role_name)
+        subject = role.name if role else role_name
+    else:
+        match = re.fullmatch(r"<@!?(\d+)>|(\d+)", target.strip())
+        if match:
+            user_id = int(match.group(1) or match.group(2))
+        else:
+            try:
+                user_id = (await commands.MemberConverter().convert(ctx, target)).id
+            except commands.BadArgument:
+                await ctx.send(f"Member '{target}' not found! Use a mention or an id for members who have left.")
+                return
+        entries = await audit_log.for_target(ctx.guild.id, user_id)
+        subject = entries[0]["target_name"] if entries else member_name(ctx.guild, user_id)
+
+    if not entries:
+        await ctx.send(f"No recorded actions for {subject}.")
+        return
+
+    lines = [f"Recent actions for {subject} (newest first):"]
+    for entry in entries:
+        when = datetime.fromtimestamp(entry["created_at"]).strftime("%Y-%m-%d %H:%M")
+        line = f"{when} {entry['action']}"
+        if role_view and entry["target_id"] != entry["role_id"]:
+            line += f" {entry['target_name']}"
+        elif not role_view and entry["role_name"]:
+            line += f" {entry['role_name']}"
+        line += f" by {member_name(ctx.guild, entry['actor_id'])}"
+        if entry["details"]:
+            line += f": {entry['details'][:100]}"
+        lines.append(line)
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="undorole")
+@commands.has_permissions(manage_roles=True)
+async def undo_role(ctx, count: int = 1):
+    """Delete the last N roles created by the bot
+    Usage: !undorole [count]
+    """
+    entries = role_history.recent(ctx.guild.id, max(1, count))
+    if not entries:
+        await ctx.send("There is nothing to undo.")
+        return
+
+    undone = []
+
+    async def delete(entry):
+        role = ctx.guild.get_role(entry.role_id)
+        if role is None:
+            undone.append(entry.role_id)
+            return SKIPPED
+        try:
+            await role.delete(reason=f"Undone by {ctx.author.display_name}")
+        except discord.NotFound:
+            undone.append(entry.role_id)
+            return SKIPPED
+        undone.append(entry.role_id)
+
+    result = await fan_out(entries, delete, limiter=role_limiter, bucket_key=lambda entry: ctx.guild.id)
+    role_history.forget(ctx.guild.id, undone)
+    names = ", ".join(entry.name for entry in entries)
+    await ctx.send(f"Undid {result.sent} role creation(s) ({names}). {result.summary()}")
+
+@bot.hybrid_command(name="listtemplates")
 async def list_templates(ctx):
     """List all available role templates and their details"""
-    await ctx.send(f"```\n{get_template_info()}\n```")
+    await ctx.send(f"```\n{template_store.template_info(ctx.guild.id)}\n```")
+
+async def autocomplete_role_name(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    if interaction.guild is None:
+        return []
+    return [app_commands.Choice(name=name, value=name) for name in role_search.complete(interaction.guild, current)]
+
+async def autocomplete_template_name(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    if interaction.guild is None:
+        return []
+    current = current.lower()
+    names = [name for name in template_store.get_templates(interaction.guild.id) if current in name]
+    names.sort(key=lambda name: not name.startswith(current))
+    return [app_commands.Choice(name=name, value=name) for name in names[:25]]
+
+for command in (role_info, delete_role, assign_role, remove_role, bulk_assign_role, bulk_remove_role):
+    command.autocomplete("role_name")(autocomplete_role_name)
+create_role_preset.autocomplete("template_name")(autocomplete_template_name)
+
+def parse_template_args(args: str):
+    """Parse key=value template options; description may be quoted."""
+    options = {}
+    for token in shlex.split(args):
+        if '=' in token:
+            key, value = token.split('=', 1)
+            options[key.lower()] = value
+    return options
+
+async def save_template_from_args(ctx, name: str, args: str, base: Optional[dict] = None):
+    try:
+        options = parse_template_args(args)
+    except ValueError as e:
+        await ctx.send(f"Could not parse template options: {e}")
+        return False
+
+    base = base or {"color": discord.Color.default(), "permissions": 0, "hoist": False,
+                    "mentionable": False, "description": "Custom template"}
+    try:
+        permissions = parse_permissions(options['perms']) if 'perms' in options else base['permissions']
+    except UnknownPermissionError as e:
+        await ctx.send(str(e))
+        return False
+
+    template_store.save_template(
+        ctx.guild.id, name,
+        color=parse_color(options['color']) if 'color' in options else base['color'],
+        permissions=permissions,
+        hoist=options['hoist'].lower() == 'true' if 'hoist' in options else base['hoist'],
+        mentionable=options['mentionable'].lower() == 'true' if 'mentionable' in options else base['mentionable'],
+        description=options.get('description', base['description']),
+    )
+    return True
+
+@bot.command(name="addtemplate")
+@commands.has_permissions(manage_roles=True)
+async def add_template(ctx, name: str, *, args: Optional[str] = ""):
+    """Add a role template for this server
+    Usage: !addtemplate name color=red perms=kick,ban hoist=true mentionable=true description="What it is for"
+    """
+    name = name.lower()
+    existing = template_store.get_template(ctx.guild.id, name)
+    if name in role_templates:
+        await ctx.send(f"'{name}' is a built-in template, pick another name.")
+        return
+    if existing is not None:
+        await ctx.send(f"Template '{name}' already exists, use !edittemplate to change it.")
+        return
+    if await save_template_from_args(ctx, name, args):
+        await ctx.send(f"Added template '{name}'.")
+
+@bot.command(name="edittemplate")
+@commands.has_permissions(manage_roles=True)
+async def edit_template(ctx, name: str, *, args: str):
+    """Change options of one of this server's templates
+    Usage: !edittemplate name [color=...] [perms=...] [hoist=...] [mentionable=...] [description="..."]
+    """
+    name = name.lower()
+    existing = template_store.get_template(ctx.guild.id, name)
+    if existing is None or not existing.get("custom"):
+        await ctx.send(f"Server template '{name}' not found!")
+        return
+    if await save_template_from_args(ctx, name, args, base=existing):
+        await ctx.send(f"Updated template '{name}'.")
+
+@bot.command(name="deletetemplate")
+@commands.has_permissions(manage_roles=True)
+async def delete_template(ctx, name: str):
+    """Delete one of this server's templates
+    Usage: !deletetemplate name
+    """
+    if template_store.delete_template(ctx.guild.id, name):
+        await ctx.send(f"Deleted template '{name.lower()}'.")
+    else:
+        await ctx.send(f"Server template '{name.lower()}' not found!")
 
 
 @bot.command(name="specialcommands")
@@ -309,16 +936,20 @@ async def knight_mute(ctx, member: discord.Member, duration: int = 5):
 
     try:
         await member.edit(mute=True)
+        audit_log.record(ctx.guild.id, "knightmute", ctx.author.id, member.id, member.name,
+                         details=f"{duration} minutes")
+        scheduler.schedule(
+            "unmute", duration * 60, ctx.guild.id,
+            {"guild_id": ctx.guild.id, "member_id": member.id, "channel_id": ctx.channel.id},
+            key=f"unmute:{ctx.guild.id}:{member.id}",
+        )
         await ctx.send(f"🔇 {member.mention} has been muted for {duration} minutes by Knight {ctx.author.display_name}")
-        await asyncio.sleep(duration * 60)
-        await member.edit(mute=False)
-        await ctx.send(f"🔊 {member.mention} has been unmuted")
     except discord.Forbidden:
         await ctx.send("I don't have permission to mute members!")
 
 # King Commands
 @bot.command(name="kingdecree")
-@has_role_permission("King")
+@has_role_permission("King", or_above=True)
 async def king_decree(ctx, *, decree: str):
     """Make a server-wide decree
     Usage: !kingdecree Your royal decree here
@@ -338,7 +969,7 @@ async def king_decree(ctx, *, decree: str):
         await ctx.send("Could not pin the decree (insufficient permissions)")
 
 @bot.command(name="kingrename")
-@has_role_permission("King")
+@has_role_permission("King", or_above=True)
 async def king_rename(ctx, member: discord.Member, *, new_name: str):
     """Rename a user
     Usage: !kingrename @user New Name
@@ -346,25 +977,64 @@ async def king_rename(ctx, member: discord.Member, *, new_name: str):
     old_name = member.display_name
     try:
         await member.edit(nick=new_name)
+        audit_log.record(ctx.guild.id, "kingrename", ctx.author.id, member.id, member.name,
+                         details=f"{old_name} -> {new_name}")
         await ctx.send(f"👑 By royal decree, {old_name} shall now be known as {new_name}")
     except discord.Forbidden:
         await ctx.send("I don't have permission to change nicknames!")
 
 @bot.command(name="kingexile")
-@has_role_permission("King")
+@has_role_permission("King", or_above=True)
 async def king_exile(ctx, member: discord.Member, *, reason: str = "Royal decree"):
     """Kick a user from the server
     Usage: !kingexile @user [reason]
     """
     try:
         await member.kick(reason=f"Exiled by King {ctx.author.display_name}: {reason}")
+        audit_log.record(ctx.guild.id, "kingexile", ctx.author.id, member.id, member.name, details=reason)
         await ctx.send(f"👑 {member.name} has been exiled from the realm!")
     except discord.Forbidden:
         await ctx.send("I don't have permission to exile members!")
 
+async def bulk_moderate(ctx, targets: str, banning: bool, default_reason: str):
+    targets, reason = split_reason(targets)
+    await role_cache.ensure_member_index(ctx.guild, allow_warm=False)
+    member_ids, dry_run, errors = resolve_targets(ctx, targets)
+    if errors:
+        await ctx.send("\n".join(errors) + f"\n{BULK_USAGE}")
+        return
+    todo, protected = filter_targets(ctx.guild, ctx.author, member_ids)
+    plan = f"{'Smiting' if banning else 'Exiling'} {len(todo)} members"
+    if protected:
+        plan += f" ({protected} protected or outranking you)"
+    if dry_run or not todo:
+        await ctx.send(f"{plan}{' [dry run]' if dry_run else ''}")
+        return
+
+    title = "God" if banning else "King"
+    full_reason = f"{'Smited' if banning else 'Exiled'} by {title} {ctx.author.display_name}: {reason or default_reason}"
+    done: List[int] = []
+    if banning:
+        result = await ban_members(ctx.guild, todo, full_reason, member_limiter, done=done)
+    else:
+        result = await kick_members(ctx.guild, todo, full_reason, member_limiter, done=done)
+    action = "godsmitemany" if banning else "kingexilemany"
+    for member_id in done:
+        audit_log.record(ctx.guild.id, action, ctx.author.id, member_id, member_name(ctx.guild, member_id),
+                         details=reason or default_reason)
+    await ctx.send(f"{'⚡' if banning else '👑'} {plan}: {result.summary()}")
+
+@bot.command(name="kingexilemany")
+@has_role_permission("King", or_above=True)
+async def king_exile_many(ctx, *, targets: str):
+    """Kick many users at once
+    Usage: !kingexilemany @user1 @user2 123456789 joined:10m [reason:"Raid"] [dry-run]
+    """
+    await bulk_moderate(ctx, targets, banning=False, default_reason="Royal decree")
+
 # God Commands
 @bot.command(name="godsmite")
-@has_role_permission("God")
+@has_role_permission("God", or_above=True)
 async def god_smite(ctx, member: discord.Member, *, reason: str = "Divine judgment"):
     """Ban a user dramatically
     Usage: !godsmite @user [reason]
@@ -381,62 +1051,186 @@ async def god_smite(ctx, member: discord.Member, *, reason: str = "Divine judgme
         await ctx.send(message)
         await asyncio.sleep(2)  # Dramatic pause
         await member.ban(reason=f"Smited by God {ctx.author.display_name}: {reason}")
+        audit_log.record(ctx.guild.id, "godsmite", ctx.author.id, member.id, member.name, details=reason)
         await ctx.send(f"The divine will has been carried out. {member.name} has been banished! ⚡")
     except discord.Forbidden:
         await ctx.send("I lack the divine permission to smite!")
 
+@bot.command(name="godsmitemany")
+@has_role_permission("God", or_above=True)
+async def god_smite_many(ctx, *, targets: str):
+    """Ban many users at once, without the dramatic pause
+    Usage: !godsmitemany @user1 @user2 123456789 joined:10m [reason:"Raid"] [dry-run]
+    """
+    await bulk_moderate(ctx, targets, banning=True, default_reason="Divine judgment")
+
 @bot.command(name="godblessing")
-@has_role_permission("God")
-async def god_blessing(ctx, member: discord.Member):
-    """Grant a random special permission to a user
-    Usage: !godblessing @user
-    """
-    blessings = [
-        ("attach_files", "share sacred scrolls"),
-        ("mention_everyone", "call upon all believers"),
-        ("manage_messages", "moderate divine messages"),
-        ("move_members", "guide lost souls")
-    ]
+@has_role_permission("God", or_above=True)
+async def god_blessing(ctx, member: discord.Member, *, duration: Optional[str] = None):
+    """Grant a random special permission to a user, optionally for a limited time
+    Usage: !godblessing @user [for 2h]
+    """
+    expires = None
+    if duration:
+        expires = parse_duration(re.sub(r"^for\s+", "", duration.strip(), flags=re.IGNORECASE))
+        if expires is None:
+            await ctx.send("Invalid duration! Use something like 30m, 2h or 7d.")
+            return
 
-    blessing = random.choice(blessings)
+    blessing = random.choice(BLESSINGS)
     try:
-        # Create a new role with the blessed permission
-        role = await ctx.guild.create_role(
-            name=f"Blessed with {blessing[1]}",
-            permissions=discord.Permissions(**{blessing[0]: True}),
-            color=discord.Color.purple(),
-            reason=f"Divine blessing from {ctx.author.display_name}"
-        )
-        await member.add_roles(role)
-        await ctx.send(f"✨ {member.mention} has been blessed with the power to {blessing[1]}!")
+        # Reuse the guild's blessing role, creating it only the first time
+        role = await blessing_pool.get_role(ctx.guild, blessing, reason=f"Divine blessing from {ctx.author.display_name}")
+        if role.id not in role_cache.member_role_ids(member):
+            await role_edits.add(member, role)
+        audit_log.record(ctx.guild.id, "godblessing", ctx.author.id, member.id, member.name, role_id=role.id,
+                         role_name=role.name, details=f"for {expires}" if expires else "")
+        key = f"remove_role:{ctx.guild.id}:{member.id}:{role.id}"
+        if expires:
+            scheduler.schedule(
+                "remove_role", expires.total_seconds(), ctx.guild.id,
+                {"guild_id": ctx.guild.id, "member_id": member.id, "role_id": role.id, "channel_id": ctx.channel.id},
+                key=key,
+            )
+            await ctx.send(f"✨ {member.mention} has been blessed with the power to {blessing[1]} for {expires}!")
+        else:
+            scheduler.cancel_key(key)
+            await ctx.send(f"✨ {member.mention} has been blessed with the power to {blessing[1]}!")
     except discord.Forbidden:
         await ctx.send("I lack the divine permission to grant blessings!")
+    except discord.HTTPException:
+        await ctx.send("The blessing failed. Please try again.")
+
+@bot.command(name="mergeblessings")
+@commands.has_permissions(manage_roles=True)
+async def merge_blessings(ctx):
+    """Merge duplicate blessing roles into one role per blessing
+    Usage: !mergeblessings
+    """
+    duplicates = sum(len(roles) for _, roles in blessing_pool.duplicates(ctx.guild))
+    if not duplicates:
+        await ctx.send("No duplicate blessing roles found.")
+        return
+    job, created = await job_queue.submit(ctx, "mergeblessings", f"Merging {duplicates} duplicate blessing roles", {})
+    if not created:
+        await ctx.send(f"Blessing roles are already being merged as job #{job.id}.")
+
+async def run_merge_blessings(job):
+    guild = bot.get_guild(job.guild_id)
+    if guild is None:
+        return "the server is unavailable"
+    await role_cache.ensure_member_index(guild, allow_warm=False)
+    reason = "Merging duplicate blessing roles"
+    merged = moved = 0
+
+    for keep, duplicates in blessing_pool.duplicates(guild):
+        async def add(member_id):
+            try:
+                await bot.http.add_role(guild.id, member_id, keep.id, reason=reason)
+            except discord.NotFound:
+                return SKIPPED
+            role_cache.apply_role_delta(guild.id, member_id, added=[keep.id])
+
+        for duplicate in duplicates:
+            member_ids = role_cache.role_members(guild, duplicate.id) - role_cache.role_members(guild, keep.id)
+            result = await fan_out(member_ids, add, limiter=member_limiter, bucket_key=lambda member_id: guild.id)
+            moved += result.sent
+            if result.failed:
+                continue  # Keep the duplicate so nobody loses their blessing
+            try:
+                await duplicate.delete(reason=reason)
+                merged += 1
+            except discord.NotFound:
+                pass
+            await job.report(f"merged {merged} roles, moved {moved} members")
+
+    return f"Merged {merged} duplicate blessing roles, moving {moved} members to the remaining ones."
 
 @bot.command(name="godspeak")
-@has_role_permission("God")
+@has_role_permission("God", or_above=True)
 async def god_speak(ctx, *, message: str):
     """Send a divine message to all channels
     Usage: !godspeak Your divine message here
     """
+    channels = ctx.guild.text_channels
+    params = {
+        "message": message,
+        "author": ctx.author.display_name,
+        "channel_ids": [channel.id for channel in channels],
+    }
+    job, created = await job_queue.submit(ctx, "godspeak", f"Spreading your divine message to {len(channels)} channels",
+                                          params, dedup=message)
+    if not created:
+        await ctx.send(f"That message is already being spread as job #{job.id}.")
+
+async def run_god_speak(job):
+    guild = bot.get_guild(job.guild_id)
+    if guild is None:
+        return "the server is unavailable"
     embed = discord.Embed(
         title="📿 Divine Message",
-        description=message,
+        description=job.params["message"],
         color=discord.Color.purple()
     )
-    embed.set_footer(text=f"Spoken by {ctx.author.display_name}, Voice of the Divine")
+    embed.set_footer(text=f"Spoken by {job.params['author']}, Voice of the Divine")
 
-    sent_count = 0
-    for channel in ctx.guild.text_channels:
-        try:
-            await channel.send(embed=embed)
-            sent_count += 1
-        except discord.Forbidden:
-            continue
+    done = set(job.checkpoint.get("done", []))
+    channels = [guild.get_channel(channel_id) for channel_id in job.params["channel_ids"] if channel_id not in done]
+
+    async def send(channel):
+        await channel.send(embed=embed)
+        done.add(channel.id)
 
-    await ctx.send(f"Your divine message has been spread to {sent_count} channels! 🙏")
+    async def progress(result):
+        job.save(done=sorted(done))
+        await job.report(result.summary())
+
+    result = await fan_out(
+        [channel for channel in channels if channel is not None],
+        send,
+        limiter=channel_limiter,
+        bucket_key=lambda channel: channel.id,
+        can_act=lambda channel: can_post(channel, embed=True),
+        on_progress=progress,
+    )
+    return f"Your divine message has been spread to {len(done)} channels! 🙏\n{result.summary()}"
+
+job_queue.register("bulkrole", run_bulk_role)
+job_queue.register("cleanroles", run_clean_roles)
+job_queue.register("godspeak", run_god_speak, priority=BROADCAST)
+job_queue.register("mergeblessings", run_merge_blessings)
+
+@bot.command(name="jobs")
+async def list_jobs(ctx):
+    """List this server's queued and running background jobs
+    Usage: !jobs
+    """
+    jobs = job_queue.jobs(ctx.guild.id)
+    if not jobs:
+        await ctx.send("No background jobs are queued or running.")
+        return
+    lines = [f"#{job.id} {job.kind} [{job.status}] {job.title}" + (f" - {job.progress}" if job.progress else "")
+             for job in jobs]
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="canceljob")
+async def cancel_job(ctx, job_id: int):
+    """Cancel a queued or running background job (your own, or any with Manage Roles)
+    Usage: !canceljob job_id
+    """
+    job = job_queue.get(ctx.guild.id, job_id)
+    if job is None:
+        await ctx.send(f"Job #{job_id} not found!")
+        return
+    if job.author_id != ctx.author.id and not ctx.author.guild_permissions.manage_roles:
+        await ctx.send("You can only cancel your own jobs!")
+        return
+    await job_queue.cancel(job)
+    await ctx.send(f"Cancelled job #{job.id}.")
 
 @bot.event
 async def on_command_error(ctx, error):
+    metrics.command_finished(ctx, "check_failed" if isinstance(error, commands.CheckFailure) else "error")
     if isinstance(error, commands.MissingPermissions):
         await ctx.send("You don't have permission to use this command!")
     elif isinstance(error, commands.MissingRequiredArgument):
@@ -446,11 +1240,17 @@ async def on_command_error(ctx, error):
     else:
         await ctx.send(f"An error occurred: {str(error)}")
 
-# Get the token from environment variables
-TOKEN = os.getenv('ur bot token (u need it for the bot to work blud)')
-if not TOKEN:
-    raise ValueError("No Discord bot token found. Please set the DISCORD_BOT_TOKEN environment variable.")
+if __name__ == "__main__":
+    # Get the token from environment variables
+    TOKEN = os.getenv('ur bot token (u need it for the bot to work blud)')
+    if not TOKEN:
+        raise ValueError("No Discord bot token found. Please set the DISCORD_BOT_TOKEN environment variable.")
 
-# Keep the bot alive
-keep_alive() # Added keep_alive() call
-bot.run(TOKEN)
\ No newline at end of file
+    if CLUSTER_ID is None:
+        # Keep the bot alive; /metrics is registered before the server starts
+        metrics.serve(getattr(keep_alive_server, "app", None))
+        keep_alive() # Added keep_alive() call
+    else:
+        # The cluster launcher serves health for every process and scrapes this.
+        metrics.serve()
+    bot.run(TOKEN)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import re
+import shlex
+import discord
+from typing import List, Set, Tuple
+
+from utils import role_cache, member_cache
+from utils.member_cache import COMPACT
+from utils.role_helpers import parse_duration
+
+BULK_USAGE = ("Targets: @mentions or member ids, from:\"Role Name\" (everyone holding a role), "
+              "match:text (display name contains text), joined:10m (joined in the last 10 minutes). "
+              "Add dry-run to only count.")
+
+
+def resolve_targets(ctx, spec: str) -> Tuple[Set[int], bool, List[str]]:
+    """Turn a bulk target spec into member ids.
+
+    Returns (member ids, dry run requested, error messages). Selectors are
+    combined, so "from:Guests @Alice" targets every Guest plus Alice.
+
+    Mentions are taken from `spec` only, never from the whole message, so
+    a mention prefix ("@Bot bulkassignrole ...") or a mention inside text
+    the caller removed from the spec (a reason:"...") is not a target.
+    """
+    guild = ctx.guild
+    member_ids: Set[int] = set()
+    dry_run = False
+    errors: List[str] = []
+    matches: List[str] = []
+
+    try:
+        tokens = shlex.split(spec)
+    except ValueError as e:
+        return set(), False, [f"Could not parse targets: {e}"]
+
+    for token in tokens:
+        lowered = token.lower()
+        if lowered in ("dry-run", "dryrun", "--dry-run"):
+            dry_run = True
+        elif lowered.startswith("from:"):
+            role = role_cache.resolve_role(guild, token[5:])
+            if role is None:
+                errors.append(f"Role '{token[5:]}' not found!")
+            else:
+                member_ids.update(role_cache.role_members(guild, role.id))
+        elif lowered.startswith("match:"):
+            matches.append(token[6:].casefold())
+        elif lowered.startswith("joined:"):
+            duration = parse_duration(token[7:])
+            if duration is None:
+                errors.append(f"Invalid duration in '{token}', use something like 10m or 2h")
+            else:
+                member_ids.update(member_cache.joined_since(guild, discord.utils.utcnow() - duration))
+        elif token.isdigit():
+            member_ids.add(int(token))
+        elif re.fullmatch(r"<@!?\d+>", token):
+            member_ids.add(int(token.strip("<@!>")))
+        elif not (token.startswith("<@") and token.endswith(">")):
+            errors.append(f"Unknown target '{token}'")
+
+    if matches and COMPACT:
+        errors.append("match: needs the full member cache (MEMBER_CACHE_MODE=full)")
+    elif matches:
+        for member in guild.members:
+            name = member.display_name.casefold()
+            if any(text in name for text in matches):
+                member_ids.add(member.id)
+
+    return member_ids, dry_run, errors
+
+
+def split_by_state(guild: discord.Guild, member_ids: Set[int], role_id: int, adding: bool) -> Tuple[List[int], int]:
+    """Split targets into those needing a change and a count of those already done.
+
+    Uses cached member roles only, so no HTTP call is made for members that
+    already hold (or already lack) the role. Uncached members are kept.
+    """
+    todo: List[int] = []
+    already = 0
+    for member_id in member_ids:
+        role_ids = role_cache.cached_role_ids(guild, member_id)
+        if role_ids is not None and (role_id in role_ids) == adding:
+            already += 1
+        else:
+            todo.append(member_id)
+    return todo, already
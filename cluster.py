@@ -0,0 +1,199 @@
+"""Sharding helpers and a multi-process cluster launcher.
+
+Usage: python cluster.py --clusters 4 [--shards 16] [--port 8080]
+
+Each cluster is a separate `python bot.py.py` process owning a contiguous
+range of shards. The launcher restarts clusters that exit and serves an
+aggregated /health and /metrics view of all of them on --port.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py.py")
+
+# BOT_SHARD_MODE=single runs one gateway connection (the default), auto lets
+# discord.py pick the shard count, cluster is set by the launcher below.
+SHARD_MODE = os.getenv("BOT_SHARD_MODE", "single").lower()
+CLUSTER_ID: Optional[int] = int(os.environ["CLUSTER_ID"]) if "CLUSTER_ID" in os.environ else None
+# Processes sharing the bot token, which share its global rate limit.
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "1"))
+
+
+def shard_options() -> Dict[str, object]:
+    """Keyword arguments for AutoShardedBot from SHARD_COUNT and SHARD_IDS."""
+    options: Dict[str, object] = {}
+    if os.getenv("SHARD_COUNT"):
+        options["shard_count"] = int(os.environ["SHARD_COUNT"])
+    if os.getenv("SHARD_IDS"):
+        options["shard_ids"] = [int(i) for i in os.environ["SHARD_IDS"].split(",")]
+    return options
+
+
+def shard_for(guild_id: int, shard_count: int) -> int:
+    """The shard Discord routes a guild to."""
+    return (guild_id >> 22) % shard_count
+
+
+def owns_guild(guild_id: int) -> bool:
+    """Whether this process's shards include the guild (always true unsharded)."""
+    options = shard_options()
+    if "shard_count" not in options or "shard_ids" not in options:
+        return True
+    return shard_for(guild_id, options["shard_count"]) in options["shard_ids"]
+
+
+def split_shards(shard_count: int, clusters: int) -> List[List[int]]:
+    """Split shard ids into `clusters` contiguous, near-equal ranges."""
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return [r for r in ranges if r]
+
+
+def recommended_shards(token: str) -> int:
+    request = urllib.request.Request("https://discord.com/api/v10/gateway/bot",
+                                     headers={"Authorization": f"Bot {token}"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+
+def label_metrics(text: str, cluster: int, seen_meta: set) -> List[str]:
+    """Add a cluster label to every sample, keeping HELP/TYPE lines once."""
+    lines = []
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line not in seen_meta:
+                seen_meta.add(line)
+                lines.append(line)
+            continue
+        name, _, value = line.rpartition(" ")
+        if "{" in name:
+            name = name.replace("{", f'{{cluster="{cluster}",', 1)
+        else:
+            name = f'{name}{{cluster="{cluster}"}}'
+        lines.append(f"{name} {value}")
+    return lines
+
+
+class Cluster:
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int, cluster_count: int,
+                 metrics_port: int):
+        self.id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.metrics_port = metrics_port
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.started = 0.0
+
+    def start(self) -> None:
+        env = dict(os.environ,
+                   BOT_SHARD_MODE="cluster",
+                   CLUSTER_ID=str(self.id),
+                   CLUSTER_COUNT=str(self.cluster_count),
+                   SHARD_COUNT=str(self.shard_count),
+                   SHARD_IDS=",".join(map(str, self.shard_ids)),
+                   METRICS_PORT=str(self.metrics_port))
+        self.process = subprocess.Popen([sys.executable, BOT_PATH], env=env)
+        self.started = time.time()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def health(self) -> Dict[str, object]:
+        return {"cluster": self.id, "shards": self.shard_ids, "alive": self.alive,
+                "pid": self.process.pid if self.process else None,
+                "restarts": self.restarts, "uptime": round(time.time() - self.started) if self.alive else 0}
+
+
+def serve_aggregate(clusters: List[Cluster], port: int) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path in ("/", "/health"):
+                health = [c.health() for c in clusters]
+                body = json.dumps({"ok": all(h["alive"] for h in health), "clusters": health}).encode()
+                content_type = "application/json"
+            elif path == "/metrics":
+                seen_meta: set = set()
+                lines: List[str] = []
+                for c in clusters:
+                    try:
+                        with urllib.request.urlopen(f"http://127.0.0.1:{c.metrics_port}/metrics", timeout=2) as r:
+                            lines.extend(label_metrics(r.read().decode(), c.id, seen_meta))
+                        up = 1
+                    except OSError:
+                        up = 0
+                    lines.append(f'bot_cluster_up{{cluster="{c.id}"}} {up}')
+                body = ("\n".join(lines) + "\n").encode()
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded processes.")
+    parser.add_argument("--clusters", type=int, default=2, help="number of processes")
+    parser.add_argument("--shards", type=int, help="total shards (default: Discord's recommendation)")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8080")), help="health/metrics port")
+    parser.add_argument("--metrics-base-port", type=int, default=9100, help="first per-cluster metrics port")
+    args = parser.parse_args()
+
+    shard_count = args.shards
+    if shard_count is None:
+        token = os.getenv("DISCORD_BOT_TOKEN")
+        if not token:
+            raise SystemExit("Pass --shards or set DISCORD_BOT_TOKEN to use Discord's recommended shard count.")
+        shard_count = recommended_shards(token)
+
+    ranges = split_shards(shard_count, args.clusters)
+    clusters = [Cluster(i, shard_ids, shard_count, len(ranges), args.metrics_base_port + i)
+                for i, shard_ids in enumerate(ranges)]
+    for cluster in clusters:
+        print(f"Starting cluster {cluster.id} with shards {cluster.shard_ids}")
+        cluster.start()
+    serve_aggregate(clusters, args.port)
+
+    try:
+        while True:
+            time.sleep(5)
+            for cluster in clusters:
+                if not cluster.alive:
+                    cluster.restarts += 1
+                    print(f"Cluster {cluster.id} exited with {cluster.process.returncode}, restarting")
+                    cluster.start()
+    except KeyboardInterrupt:
+        for cluster in clusters:
+            if cluster.alive:
+                cluster.process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import discord
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils import role_cache
+from utils.member_cache import COMPACT
+
+# How long to collect role changes for a member before writing them.
+COALESCE_WINDOW = float(os.getenv("ROLE_COALESCE_WINDOW", "0.5"))
+
+
+class _PendingEdit:
+    def __init__(self, member: discord.Member):
+        self.member = member
+        self.adds: Set[int] = set()
+        self.removes: Set[int] = set()
+        self.reasons: List[str] = []
+        self.waiters: List[asyncio.Future] = []
+
+
+class RoleEditCoalescer:
+    """Merge role adds/removes for the same member into one member edit.
+
+    Every change waits up to `window` seconds for others targeting the same
+    member, then all of them are written with a single
+    member.edit(roles=...) call. Each caller gets the outcome of that call,
+    so a failed write raises in every command that contributed to it.
+
+    In lite mode the member's role list may be stale, and replacing the
+    whole list would revert changes made elsewhere, so each changed role is
+    added or removed on its own instead.
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW):
+        self.window = window
+        self._pending: Dict[Tuple[int, int], _PendingEdit] = {}
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def add(self, member: discord.Member, role: discord.abc.Snowflake, reason: Optional[str] = None) -> None:
+        await self._queue(member, role.id, True, reason)
+
+    async def remove(self, member: discord.Member, role: discord.abc.Snowflake, reason: Optional[str] = None) -> None:
+        await self._queue(member, role.id, False, reason)
+
+    async def _queue(self, member: discord.Member, role_id: int, adding: bool, reason: Optional[str]) -> None:
+        loop = asyncio.get_running_loop()
+        key = (member.guild.id, member.id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _PendingEdit(member)
+            loop.call_later(self.window, self._start_flush, key)
+        pending.member = member
+        if adding:
+            pending.adds.add(role_id)
+            pending.removes.discard(role_id)
+        else:
+            pending.removes.add(role_id)
+            pending.adds.discard(role_id)
+        if reason:
+            pending.reasons.append(reason)
+        waiter = loop.create_future()
+        pending.waiters.append(waiter)
+        await waiter
+
+    def _start_flush(self, key: Tuple[int, int]) -> None:
+        task = asyncio.ensure_future(self._flush(key))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, key: Tuple[int, int]) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        reason = "; ".join(dict.fromkeys(pending.reasons)) or None
+        try:
+            if COMPACT:
+                adds = [discord.Object(id=role_id) for role_id in pending.adds]
+                removes = [discord.Object(id=role_id) for role_id in pending.removes]
+                if adds:
+                    await pending.member.add_roles(*adds, reason=reason)
+                if removes:
+                    await pending.member.remove_roles(*removes, reason=reason)
+            else:
+                current = role_cache.member_role_ids(pending.member)
+                roles = (current | pending.adds) - pending.removes
+                if roles != current:
+                    await pending.member.edit(
+                        roles=[discord.Object(id=role_id) for role_id in roles],
+                        reason=reason,
+                    )
+        except Exception as e:
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        else:
+            role_cache.apply_role_delta(key[0], key[1], added=pending.adds, removed=pending.removes)
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+
+role_edits = RoleEditCoalescer()
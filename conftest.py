@@ -0,0 +1,100 @@
+"""Test setup.
+
+The repository is the bot's `utils` package, and the modules import each
+other as `utils.<module>`. The checkout is registered under that name so
+the tests run whatever its directory is called.
+"""
+import importlib.util
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+if "utils" not in sys.modules:
+    _spec = importlib.util.spec_from_file_location("utils", os.path.join(ROOT, "__init__.py"),
+                                                   submodule_search_locations=[ROOT])
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules["utils"] = _module
+    _spec.loader.exec_module(_module)
+
+
+class FakeRole:
+    def __init__(self, guild, role_id, name, position):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = position
+
+    def is_default(self):
+        return self.position == 0
+
+    def __lt__(self, other):
+        return (self.position, self.id) < (other.position, other.id)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __repr__(self):
+        return f"<FakeRole {self.name} @{self.position}>"
+
+
+class FakeMember:
+    def __init__(self, guild, member_id, roles):
+        self.guild = guild
+        self.id = member_id
+        self._roles = [role.id for role in roles]
+
+
+class FakeGuild:
+    """Just enough of discord.Guild for the role caches and planners."""
+
+    def __init__(self, guild_id, roles):
+        self.id = guild_id
+        self._roles = {}
+        for i, (name, position) in enumerate(roles):
+            role = FakeRole(self, guild_id * 1000 + i, name, position)
+            self._roles[role.id] = role
+
+    @property
+    def roles(self):
+        return sorted(self._roles.values())
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def role(self, name):
+        return next(role for role in self._roles.values() if role.name == name)
+
+    def member(self, member_id, *names):
+        return FakeMember(self, member_id, [self.role(name) for name in names])
+
+
+_guild_ids = itertools.count(1)
+
+
+@pytest.fixture
+def make_guild():
+    """Build a fake guild from (name, position) pairs, @everyone included.
+
+    Every guild gets a new id, so the module-level caches never mix tests.
+    """
+    def make(*roles):
+        return FakeGuild(next(_guild_ids), [("@everyone", 0), *roles])
+    return make
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point storage at a fresh SQLite file."""
+    from utils import storage
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(storage, "_connection", None)
+    yield
+    if storage._connection is not None:
+        storage._connection.close()
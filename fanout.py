@@ -0,0 +1,106 @@
+import asyncio
+import time
+import discord
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Iterable, List, Optional
+
+from utils.ratelimit import BucketLimiter
+
+# Outcomes a fan-out worker can report for a single item.
+SENT = "sent"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+@dataclass
+class FanoutResult:
+    """Running tally of a fan-out operation."""
+    total: int = 0
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+    started: float = 0.0
+    finished: Optional[float] = None
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.skipped + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self) -> str:
+        return (f"{self.done}/{self.total} done: {self.sent} sent, {self.skipped} skipped, "
+                f"{self.failed} failed in {self.elapsed:.1f}s")
+
+
+async def fan_out(
+    items: Iterable[Any],
+    action: Callable[[Any], Awaitable[Optional[str]]],
+    *,
+    concurrency: int = 8,
+    limiter: Optional[BucketLimiter] = None,
+    bucket_key: Callable[[Any], Hashable] = lambda item: None,
+    can_act: Optional[Callable[[Any], bool]] = None,
+    on_progress: Optional[Callable[[FanoutResult], Awaitable[None]]] = None,
+    progress_interval: float = 2.0,
+) -> FanoutResult:
+    """Run `action` over `items` with bounded concurrency.
+
+    Items failing `can_act` are skipped without calling the API. `action` may
+    return SKIPPED to mark an item as skipped; raising discord.HTTPException
+    counts as a failure. `on_progress` is called at most once per
+    `progress_interval` seconds and once more at the end.
+    """
+    items = list(items)
+    result = FanoutResult(total=len(items), started=time.monotonic())
+    pending: List[Any] = []
+    for item in items:
+        if can_act is not None and not can_act(item):
+            result.skipped += 1
+        else:
+            pending.append(item)
+
+    queue = iter(pending)
+    last_report = result.started
+
+    async def report(final: bool = False) -> None:
+        nonlocal last_report
+        if on_progress is None:
+            return
+        now = time.monotonic()
+        if final or now - last_report >= progress_interval:
+            last_report = now
+            try:
+                await on_progress(result)
+            except discord.HTTPException:
+                pass
+
+    async def worker() -> None:
+        for item in queue:
+            if limiter is not None:
+                await limiter.acquire(bucket_key(item))
+            try:
+                outcome = await action(item)
+            except discord.HTTPException:
+                result.failed += 1
+            else:
+                if outcome == SKIPPED:
+                    result.skipped += 1
+                elif outcome == FAILED:
+                    result.failed += 1
+                else:
+                    result.sent += 1
+            await report()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(pending))))))
+    result.finished = time.monotonic()
+    await report(final=True)
+    return result
+
+
+def can_post(channel: discord.abc.GuildChannel, embed: bool = False) -> bool:
+    """Whether the bot may post in a channel, checked from cached overwrites."""
+    perms = channel.permissions_for(channel.guild.me)
+    return perms.view_channel and perms.send_messages and (perms.embed_links or not embed)
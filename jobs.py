@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import discord
+
+from utils.ratelimit import ROLE_EDITS, set_request_context
+from utils.storage import ensure_schema
+
+# Jobs running at once across all guilds, and within one guild.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_WORKERS_PER_GUILD = int(os.getenv("JOB_WORKERS_PER_GUILD", "1"))
+# Minimum seconds between edits of a job's status message.
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "2"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER,
+    author_id INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    checkpoint TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_guild ON jobs (guild_id);
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+
+
+@dataclass
+class Job:
+    """A queued or running guild operation.
+
+    `params` describe the work and never change; `checkpoint` holds whatever
+    the handler saved so far, so a job resumed after a restart can skip the
+    part it already did.
+    """
+    id: int
+    guild_id: int
+    kind: str
+    key: str
+    title: str
+    channel_id: int
+    message_id: Optional[int]
+    author_id: int
+    params: Dict[str, Any]
+    checkpoint: Dict[str, Any]
+    created_at: float
+    status: str = QUEUED
+    progress: str = ""
+    resumed: bool = False
+    cancelled: bool = False
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    queue: Optional["JobQueue"] = field(default=None, repr=False)
+    last_edit: float = 0.0
+
+    def save(self, **checkpoint: Any) -> None:
+        """Persist progress; a resumed job starts from the saved checkpoint."""
+        self.checkpoint.update(checkpoint)
+        self.queue._db().execute("UPDATE jobs SET checkpoint = ? WHERE id = ?",
+                                 (json.dumps(self.checkpoint), self.id))
+
+    async def report(self, text: str, final: bool = False) -> None:
+        """Show progress in the job's status message, at most once per JOB_PROGRESS_INTERVAL."""
+        self.progress = text
+        now = time.monotonic()
+        if not final and now - self.last_edit < JOB_PROGRESS_INTERVAL:
+            return
+        self.last_edit = now
+        await self.queue._edit_status(self, text)
+
+
+Handler = Callable[[Job], Awaitable[str]]
+
+
+class JobQueue:
+    """Per-guild queue for long-running operations, persisted in SQLite.
+
+    Each guild runs at most `per_guild` jobs at once and at most `workers`
+    run across all guilds. Submitting a job identical to one already queued
+    or running returns the existing job instead. A job's row is deleted once
+    it finishes, fails or is cancelled, so anything left at shutdown is
+    resumed from its checkpoint by start() on the next run.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, per_guild: int = JOB_WORKERS_PER_GUILD):
+        self.workers = workers
+        self.per_guild = per_guild
+        self._handlers: Dict[str, Handler] = {}
+        self._priorities: Dict[str, int] = {}
+        self._jobs: Dict[int, Job] = {}
+        self._queued: Dict[int, Deque[Job]] = {}
+        self._running: Dict[int, int] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._bot = None
+        self._conn = None
+        self._stopping = False
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = ensure_schema(SCHEMA)
+        return self._conn
+
+    def register(self, kind: str, handler: Handler, priority: int = ROLE_EDITS) -> None:
+        """Register the coroutine that runs `kind` jobs and returns their final status text.
+
+        `priority` is the outbound request class the job's HTTP calls use.
+        """
+        self._handlers[kind] = handler
+        self._priorities[kind] = priority
+
+    def start(self, bot, guild_filter: Optional[Callable[[int], bool]] = None) -> None:
+        """Resume jobs interrupted by the last shutdown. Idempotent."""
+        if self._bot is not None:
+            return
+        self._bot = bot
+        for row in self._db().execute("SELECT * FROM jobs ORDER BY id"):
+            if guild_filter is not None and not guild_filter(row["guild_id"]):
+                continue
+            if row["id"] in self._jobs:
+                continue  # Submitted by a command that ran before on_ready
+            if row["kind"] not in self._handlers:
+                print(f"No handler registered for job kind '{row['kind']}', dropping job {row['id']}")
+                self._db().execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+                continue
+            job = Job(row["id"], row["guild_id"], row["kind"], row["key"], row["title"], row["channel_id"],
+                      row["message_id"], row["author_id"], json.loads(row["params"]),
+                      json.loads(row["checkpoint"]), row["created_at"], resumed=True, queue=self)
+            self._enqueue(job)
+
+    async def submit(self, ctx, kind: str, title: str, params: Dict[str, Any],
+                     dedup: Any = None) -> Tuple[Job, bool]:
+        """Queue a job and post its status message.
+
+        Jobs are identical when their kind and `dedup` value (by default their
+        params) match. Returns the job and whether it was newly created.
+        """
+        digest = hashlib.sha1(json.dumps(params if dedup is None else dedup, sort_keys=True).encode()).hexdigest()
+        key = f"{kind}:{digest}"
+        for job in self._jobs.values():
+            if job.guild_id == ctx.guild.id and job.key == key:
+                return job, False
+        created_at = time.time()
+        cursor = self._db().execute(
+            "INSERT INTO jobs (guild_id, kind, key, title, channel_id, author_id, params, checkpoint, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, '{}', ?)",
+            (ctx.guild.id, kind, key, title, ctx.channel.id, ctx.author.id, json.dumps(params), created_at),
+        )
+        job = Job(cursor.lastrowid, ctx.guild.id, kind, key, title, ctx.channel.id, None, ctx.author.id,
+                  params, {}, created_at, queue=self)
+        try:
+            status = await ctx.send(f"[job #{job.id}] {title}: queued")
+            job.message_id = status.id
+            self._db().execute("UPDATE jobs SET message_id = ? WHERE id = ?", (status.id, job.id))
+        except discord.HTTPException:
+            pass
+        self._enqueue(job)
+        return job, True
+
+    async def stop(self) -> None:
+        """Interrupt running jobs for shutdown, keeping every row for the next start()."""
+        self._stopping = True
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def jobs(self, guild_id: int) -> List[Job]:
+        return sorted((job for job in self._jobs.values() if job.guild_id == guild_id), key=lambda job: job.id)
+
+    def get(self, guild_id: int, job_id: int) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.guild_id == guild_id else None
+
+    async def cancel(self, job: Job) -> None:
+        if job.status == RUNNING:
+            job.cancelled = True
+            job.task.cancel()
+            return
+        self._queued[job.guild_id].remove(job)
+        self._finish(job)
+        await job.report("cancelled", final=True)
+
+    def _enqueue(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._queued.setdefault(job.guild_id, deque()).append(job)
+        self._pump(job.guild_id)
+
+    def _pump(self, guild_id: int) -> None:
+        if self._stopping:
+            return
+        queued = self._queued.get(guild_id)
+        while queued and self._running.get(guild_id, 0) < self.per_guild:
+            job = queued.popleft()
+            job.status = RUNNING
+            self._running[guild_id] = self._running.get(guild_id, 0) + 1
+            job.task = asyncio.create_task(self._run(job))
+        if not queued:
+            self._queued.pop(guild_id, None)
+
+    def _finish(self, job: Job) -> None:
+        self._db().execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+        self._jobs.pop(job.id, None)
+
+    async def _run(self, job: Job) -> None:
+        set_request_context(self._priorities[job.kind], job.guild_id)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        try:
+            try:
+                async with self._slots:
+                    await job.report("resuming after restart" if job.resumed else "started", final=True)
+                    result = await self._handlers[job.kind](job)
+            except asyncio.CancelledError:
+                if not job.cancelled:
+                    raise  # Shutting down: keep the row so the job resumes
+                result = f"cancelled ({job.progress})" if job.progress else "cancelled"
+            except Exception:
+                print(f"Job {job.id} ({job.kind}) for guild {job.guild_id} failed:")
+                traceback.print_exc()
+                result = "failed, see the bot logs"
+            self._finish(job)
+            await job.report(result, final=True)
+        finally:
+            self._running[job.guild_id] -= 1
+            if not self._running[job.guild_id]:
+                del self._running[job.guild_id]
+            self._pump(job.guild_id)
+
+    async def _edit_status(self, job: Job, text: str) -> None:
+        if job.message_id is None or self._bot is None:
+            return
+        channel = self._bot.get_channel(job.channel_id)
+        if channel is None:
+            return
+        try:
+            await channel.get_partial_message(job.message_id).edit(content=f"[job #{job.id}] {job.title}: {text}")
+        except discord.HTTPException:
+            pass
+
+
+job_queue = JobQueue()
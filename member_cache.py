@@ -0,0 +1,74 @@
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, Set, Tuple
+
+import discord
+
+# MEMBER_CACHE_MODE=full (default) keeps discord.py's full member cache and
+# chunks every guild at startup. lite skips chunking and keeps no Member
+# objects: role_cache stores each member as an id and a packed array of role
+# ids, and full members are fetched on demand into a small LRU.
+CACHE_MODE = os.getenv("MEMBER_CACHE_MODE", "full").lower()
+COMPACT = CACHE_MODE == "lite"
+MEMBER_LRU_SIZE = int(os.getenv("MEMBER_LRU_SIZE", "1000"))
+# Fetched members go stale (no updates arrive for uncached members), so they
+# are only reused for a short while.
+MEMBER_LRU_TTL = float(os.getenv("MEMBER_LRU_TTL", "60"))
+
+# Recent joins per guild in lite mode, where guild.members is empty, for the
+# joined: target filter.
+RECENT_JOINS_SIZE = int(os.getenv("RECENT_JOINS_SIZE", "5000"))
+
+_members: "OrderedDict[Tuple[int, int], Tuple[discord.Member, float]]" = OrderedDict()
+_recent_joins: Dict[int, Deque[Tuple[int, float]]] = {}
+
+
+def bot_options() -> Dict[str, object]:
+    """Extra commands.Bot keyword arguments for the configured cache mode."""
+    if not COMPACT:
+        return {}
+    return {"member_cache_flags": discord.MemberCacheFlags.none(), "chunk_guilds_at_startup": False}
+
+
+async def get_member(guild: discord.Guild, member_id: int) -> discord.Member:
+    """Get a full member from the cache, the LRU, or the API (raises NotFound)."""
+    member = guild.get_member(member_id)
+    if member is not None:
+        return member
+    key = (guild.id, member_id)
+    entry = _members.get(key)
+    if entry is not None and time.monotonic() - entry[1] < MEMBER_LRU_TTL:
+        _members.move_to_end(key)
+        return entry[0]
+    member = await guild.fetch_member(member_id)
+    _members[key] = (member, time.monotonic())
+    _members.move_to_end(key)
+    if len(_members) > MEMBER_LRU_SIZE:
+        _members.popitem(last=False)
+    return member
+
+
+def forget_member(guild_id: int, member_id: int) -> None:
+    _members.pop((guild_id, member_id), None)
+
+
+def record_join(member: discord.Member) -> None:
+    if not COMPACT:
+        return
+    joins = _recent_joins.get(member.guild.id)
+    if joins is None:
+        joins = _recent_joins[member.guild.id] = deque(maxlen=RECENT_JOINS_SIZE)
+    joins.append((member.id, member.joined_at.timestamp() if member.joined_at else time.time()))
+
+
+def joined_since(guild: discord.Guild, since: datetime) -> Set[int]:
+    """Ids of members who joined at or after `since` (an aware datetime).
+
+    Uses cached join times; in lite mode only joins seen since startup count.
+    """
+    if not COMPACT:
+        return {member.id for member in guild.members if member.joined_at and member.joined_at >= since}
+    cutoff = since.timestamp()
+    return {member_id for member_id, joined in _recent_joins.get(guild.id, ()) if joined >= cutoff}
@@ -0,0 +1,216 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Lightweight Prometheus-style metrics. Updates are plain dict increments on
+# the event loop thread, so they are cheap enough to leave on in production.
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_registry: List["_Metric"] = []
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in list(self.values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        self.fn = fn
+        self.values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self.values[_key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                self.values[()] = self.fn()
+            except Exception:
+                pass
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in list(self.values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: List[float]):
+        super().__init__(name, help_text)
+        self.buckets = sorted(buckets)
+        self.counts: Dict[LabelKey, List[int]] = {}
+        self.sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, counts in list(self.counts.items()):
+            counts = list(counts)
+            total = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {self.sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {total}")
+        return lines
+
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+commands_total = Counter("bot_commands_total", "Command invocations by command and outcome")
+command_seconds = Histogram("bot_command_duration_seconds", "Command latency", LATENCY_BUCKETS)
+http_requests_total = Counter("bot_http_requests_total", "Discord HTTP requests by route and status")
+http_seconds = Histogram("bot_http_request_duration_seconds", "Discord HTTP request latency", LATENCY_BUCKETS)
+ratelimit_wait_seconds = Counter("bot_ratelimit_wait_seconds_total", "Time spent waiting on local rate-limit buckets")
+outbound_queue_depth = Gauge("bot_outbound_queue_depth", "HTTP requests waiting for the global bucket by priority")
+outbound_wait_seconds = Histogram("bot_outbound_wait_seconds", "Time HTTP requests waited for the global bucket",
+                                  LATENCY_BUCKETS)
+cache_requests_total = Counter("bot_cache_requests_total", "Cache lookups by cache and result")
+loop_lag_seconds = Histogram("bot_event_loop_lag_seconds", "Event loop scheduling delay",
+                             [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1])
+gateway_latency = Gauge("bot_gateway_latency_seconds", "Gateway heartbeat latency")
+shard_latency = Gauge("bot_shard_latency_seconds", "Gateway heartbeat latency per shard")
+warm_guilds = Gauge("bot_warm_guilds", "Guilds still served from a saved snapshot")
+warm_state_age = Gauge("bot_warm_state_age_seconds", "Age of the oldest saved snapshot still in use")
+
+# Callbacks run before each scrape to refresh gauges.
+_collectors: List[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    _collectors.append(fn)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception:
+            pass
+    lines: List[str] = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def command_started(ctx) -> None:
+    ctx._metrics_started = time.perf_counter()
+
+
+def command_finished(ctx, outcome: str) -> None:
+    started = getattr(ctx, "_metrics_started", None)
+    name = ctx.command.qualified_name if ctx.command else "unknown"
+    commands_total.inc(command=name, outcome=outcome)
+    if started is not None:
+        command_seconds.observe(time.perf_counter() - started, command=name)
+
+
+def instrument_http(http) -> None:
+    """Wrap discord.py's HTTPClient.request to count and time every request."""
+    if getattr(http, "_metrics_wrapped", False):
+        return
+    request = http.request
+
+    async def timed_request(route, *args, **kwargs):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await request(route, *args, **kwargs)
+        except Exception as e:
+            status = str(getattr(e, "status", type(e).__name__))
+            raise
+        finally:
+            label = f"{route.method} {route.path}"
+            http_requests_total.inc(route=label, status=status)
+            http_seconds.observe(time.perf_counter() - started, route=label)
+
+    http.request = timed_request
+    http._metrics_wrapped = True
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Record how late the loop wakes up from a sleep of `interval` seconds."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(app=None, port: Optional[int] = None) -> None:
+    """Expose /metrics on the keep-alive Flask app, or on its own port if there is none."""
+    if app is not None and hasattr(app, "add_url_rule"):
+        app.add_url_rule("/metrics", "metrics", lambda: (render(), 200, {"Content-Type": "text/plain; version=0.0.4"}))
+        return
+    port = port or int(os.getenv("METRICS_PORT", "9090"))
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
@@ -0,0 +1,97 @@
+import re
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import discord
+
+from utils import role_cache
+from utils.fanout import fan_out, FanoutResult, SKIPPED
+from utils.ratelimit import BucketLimiter
+
+# Discord bans at most this many users per bulk-ban request.
+BULK_BAN_SIZE = 200
+
+
+def split_reason(spec: str) -> Tuple[str, Optional[str]]:
+    """Take a reason:"..." (or reason:word) out of a target spec."""
+    match = re.search(r'(?:^|\s)reason:(?:"([^"]*)"|(\S+))', spec)
+    if not match:
+        return spec, None
+    reason = match.group(1) if match.group(1) is not None else match.group(2)
+    return (spec[:match.start()] + spec[match.end():]).strip(), reason
+
+
+def filter_targets(guild: discord.Guild, actor: discord.Member, member_ids: Iterable[int]) -> Tuple[List[int], int]:
+    """Drop targets the actor may not act on; returns (allowed ids, protected count).
+
+    The actor, the bot and the owner are always protected, as is anyone whose
+    cached top role is not below both the actor's and the bot's.
+    """
+    protected_ids = {actor.id, guild.me.id, guild.owner_id}
+    ceiling = role_cache.top_position(guild.me)
+    if actor.id != guild.owner_id:
+        ceiling = min(ceiling, role_cache.top_position(actor))
+    allowed: List[int] = []
+    protected = 0
+    for member_id in member_ids:
+        role_ids = role_cache.cached_role_ids(guild, member_id)
+        top = max((role_cache.role_position(guild, role_id) for role_id in role_ids or ()), default=0)
+        if member_id in protected_ids or top >= ceiling:
+            protected += 1
+        else:
+            allowed.append(member_id)
+    return allowed, protected
+
+
+async def ban_members(guild: discord.Guild, member_ids: List[int], reason: str,
+                      limiter: Optional[BucketLimiter] = None, concurrency: int = 8,
+                      done: Optional[List[int]] = None) -> FanoutResult:
+    """Ban many users, through the bulk-ban endpoint when discord.py has it.
+
+    The ids actually banned are appended to `done` when it is given.
+    """
+    done = [] if done is None else done
+    if not hasattr(guild, "bulk_ban"):
+        async def ban(member_id):
+            await guild.ban(discord.Object(id=member_id), reason=reason, delete_message_seconds=0)
+            done.append(member_id)
+
+        return await fan_out(member_ids, ban, concurrency=concurrency, limiter=limiter,
+                             bucket_key=lambda member_id: guild.id)
+
+    result = FanoutResult(total=len(member_ids), started=time.monotonic())
+    for start in range(0, len(member_ids), BULK_BAN_SIZE):
+        batch = member_ids[start:start + BULK_BAN_SIZE]
+        if limiter is not None:
+            await limiter.acquire(guild.id)
+        try:
+            banned = await guild.bulk_ban([discord.Object(id=member_id) for member_id in batch],
+                                          reason=reason, delete_message_seconds=0)
+        except discord.HTTPException:
+            result.failed += len(batch)
+        else:
+            result.sent += len(banned.banned)
+            result.failed += len(banned.failed)
+            done.extend(user.id for user in banned.banned)
+    result.finished = time.monotonic()
+    return result
+
+
+async def kick_members(guild: discord.Guild, member_ids: List[int], reason: str,
+                       limiter: Optional[BucketLimiter] = None, concurrency: int = 8,
+                       done: Optional[List[int]] = None) -> FanoutResult:
+    """Kick many members with bounded concurrency (Discord has no bulk kick).
+
+    The ids actually kicked are appended to `done` when it is given.
+    """
+    done = [] if done is None else done
+
+    async def kick(member_id):
+        try:
+            await guild.kick(discord.Object(id=member_id), reason=reason)
+        except discord.NotFound:
+            return SKIPPED
+        done.append(member_id)
+
+    return await fan_out(member_ids, kick, concurrency=concurrency, limiter=limiter,
+                         bucket_key=lambda member_id: guild.id)
@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import json
+import os
+import discord
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.role_helpers import parse_color, parse_permissions, role_templates, UnknownPermissionError
+from utils.fanout import fan_out, FanoutResult
+from utils.ratelimit import BucketLimiter
+from utils.role_positions import plan_reorder
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class ManifestError(Exception):
+    """Raised for manifests that cannot be read or contain invalid roles."""
+
+
+@dataclass
+class RoleSpec:
+    name: str
+    color: discord.Color
+    permissions: discord.Permissions
+    hoist: bool = False
+    mentionable: bool = False
+
+    def differs_from(self, role: discord.Role) -> bool:
+        return (role.color.value != self.color.value
+                or role.permissions.value != self.permissions.value
+                or role.hoist != self.hoist
+                or role.mentionable != self.mentionable)
+
+
+@dataclass
+class ProvisionPlan:
+    creates: List[RoleSpec] = field(default_factory=list)
+    edits: List[Any] = field(default_factory=list)  # (discord.Role, RoleSpec)
+    unchanged: int = 0
+    order: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"{len(self.creates)} to create, {len(self.edits)} to edit, "
+                f"{self.unchanged} unchanged, {len(self.order)} roles in the manifest order")
+
+
+def load_manifest(text: str, templates: Optional[Dict[str, dict]] = None) -> List[RoleSpec]:
+    """Parse a JSON or YAML role manifest.
+
+    The manifest is a list of roles (or {"roles": [...]}) from the top of the
+    role list down. Each role has a name and optionally color, perms,
+    template, hoist and mentionable; explicit fields override the template.
+    `templates` defaults to the built-in role_templates.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        if yaml is None:
+            raise ManifestError("Manifest is not valid JSON (install PyYAML for YAML manifests).")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ManifestError(f"Manifest is not valid JSON or YAML: {e}")
+
+    if isinstance(data, dict):
+        data = data.get("roles")
+    if not isinstance(data, list):
+        raise ManifestError("Manifest must be a list of roles or contain a 'roles' list.")
+
+    specs = []
+    seen = set()
+    for i, entry in enumerate(data, 1):
+        if not isinstance(entry, dict) or not entry.get("name"):
+            raise ManifestError(f"Role #{i} needs a name.")
+        name = str(entry["name"])
+        if name in seen:
+            raise ManifestError(f"Role '{name}' is listed twice.")
+        seen.add(name)
+        specs.append(_build_spec(name, entry, templates or role_templates))
+    return specs
+
+
+def _build_spec(name: str, entry: Dict[str, Any], templates: Dict[str, dict]) -> RoleSpec:
+    spec = RoleSpec(name=name, color=discord.Color.default(), permissions=discord.Permissions())
+    template_name = entry.get("template")
+    if template_name:
+        template = templates.get(str(template_name).lower())
+        if template is None:
+            raise ManifestError(f"Role '{name}': unknown template '{template_name}'.")
+        spec.color = template["color"]
+        spec.permissions = discord.Permissions(template["permissions"])
+        spec.hoist = template["hoist"]
+        spec.mentionable = template["mentionable"]
+    if "color" in entry:
+        spec.color = parse_color(str(entry["color"]))
+    if "perms" in entry:
+        perms = entry["perms"]
+        if isinstance(perms, list):
+            perms = ",".join(perms)
+        try:
+            spec.permissions = discord.Permissions(parse_permissions(str(perms)))
+        except UnknownPermissionError as e:
+            raise ManifestError(f"Role '{name}': {e}")
+    if "hoist" in entry:
+        spec.hoist = bool(entry["hoist"])
+    if "mentionable" in entry:
+        spec.mentionable = bool(entry["mentionable"])
+    return spec
+
+
+def plan_provision(roles: List[discord.Role], specs: List[RoleSpec]) -> ProvisionPlan:
+    """Diff a manifest against the guild's roles (matched by exact name)."""
+    by_name: Dict[str, discord.Role] = {}
+    for role in roles:
+        by_name.setdefault(role.name, role)
+    plan = ProvisionPlan(order=[spec.name for spec in specs])
+    for spec in specs:
+        role = by_name.get(spec.name)
+        if role is None:
+            plan.creates.append(spec)
+        elif spec.differs_from(role):
+            plan.edits.append((role, spec))
+        else:
+            plan.unchanged += 1
+    return plan
+
+
+def plan_order(roles: List[discord.Role], order: List[str]) -> Dict[discord.Role, int]:
+    """Positions putting the manifest roles in manifest order.
+
+    The manifest roles are rearranged among the slots they already occupy,
+    so roles outside the manifest never move. Only changed roles are returned.
+    """
+    by_name: Dict[str, discord.Role] = {}
+    for role in roles:
+        by_name.setdefault(role.name, role)
+    managed = [by_name[name] for name in order if name in by_name]
+    # Manifests list roles top first; plan_reorder wants them lowest first.
+    return plan_reorder(roles, managed[::-1])
+
+
+async def apply_plan(
+    guild: discord.Guild,
+    plan: ProvisionPlan,
+    limiter: Optional[BucketLimiter] = None,
+    on_progress: Optional[Callable[[FanoutResult], Awaitable[None]]] = None,
+    reason: str = "Role manifest",
+) -> FanoutResult:
+    """Apply creates and edits concurrently, then reorder in one request."""
+    ceiling = guild.me.top_role
+    work = [(None, spec) for spec in plan.creates] + list(plan.edits)
+    created: List[discord.Role] = []
+
+    async def apply(item):
+        role, spec = item
+        if role is None:
+            role = await guild.create_role(name=spec.name, color=spec.color, permissions=spec.permissions,
+                                           hoist=spec.hoist, mentionable=spec.mentionable, reason=reason)
+            created.append(role)
+        else:
+            await role.edit(color=spec.color, permissions=spec.permissions,
+                            hoist=spec.hoist, mentionable=spec.mentionable, reason=reason)
+
+    result = await fan_out(
+        work,
+        apply,
+        concurrency=4,
+        limiter=limiter,
+        bucket_key=lambda item: guild.id,
+        can_act=lambda item: item[0] is None or item[0] < ceiling,
+        on_progress=on_progress,
+    )
+    # Created roles only reach guild.roles once their gateway event arrives.
+    roles = sorted({role.id: role for role in guild.roles + created}.values())
+    changes = {role: position for role, position in plan_order(roles, plan.order).items()
+               if role < ceiling and position < ceiling.position}
+    if changes:
+        await guild.edit_role_positions(changes, reason=reason)
+    return result
+
+
+async def _run_cli(args) -> None:
+    with open(args.manifest, encoding="utf-8") as f:
+        specs = load_manifest(f.read())
+    for spec in specs:
+        print(f"{spec.name}: color=#{spec.color.value:06x} permissions={spec.permissions.value} "
+              f"hoist={spec.hoist} mentionable={spec.mentionable}")
+    if args.guild is None:
+        return
+
+    token = os.getenv("DISCORD_BOT_TOKEN")
+    if not token:
+        raise SystemExit("Set DISCORD_BOT_TOKEN to compare against or apply to a guild.")
+    client = discord.Client(intents=discord.Intents(guilds=True))
+
+    @client.event
+    async def on_ready():
+        try:
+            guild = client.get_guild(args.guild)
+            if guild is None:
+                print(f"Guild {args.guild} not found.")
+                return
+            plan = plan_provision(guild.roles, specs)
+            print(plan.summary())
+            if args.apply:
+                result = await apply_plan(guild, plan, reason="Role manifest (CLI)")
+                print(result.summary())
+        finally:
+            await client.close()
+
+    await client.start(token)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate a role manifest and optionally apply it to a guild.")
+    parser.add_argument("manifest", help="JSON or YAML manifest file")
+    parser.add_argument("--guild", type=int, help="guild id to diff against")
+    parser.add_argument("--apply", action="store_true", help="apply the diff instead of only printing it")
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Optional
+
+from utils import metrics
+from utils.cluster import CLUSTER_COUNT
+
+# Discord allows 50 requests per second globally per bot token; stay a little
+# below it. Every cluster process (see cluster.py) uses the same token, so
+# each one gets an equal share.
+GLOBAL_RATE = 45.0 / CLUSTER_COUNT
+
+# Priority classes for outbound requests, most urgent first.
+MODERATION = 0
+ROLE_EDITS = 1
+BROADCAST = 2
+PRIORITY_NAMES = ("moderation", "role_edits", "broadcast")
+
+# (priority, guild id) of the work the current task is doing. Set once per
+# command and per background job; tasks they spawn inherit it.
+_request_context: contextvars.ContextVar = contextvars.ContextVar("request_context", default=(ROLE_EDITS, None))
+
+
+def set_request_context(priority: int, guild_id: Optional[int] = None) -> None:
+    _request_context.set((priority, guild_id))
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per `per` seconds, bursting to `rate`."""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self.capacity = rate
+        self.tokens = rate
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the time waited."""
+        async with self._lock:
+            self._refill()
+            delay = 0.0
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.fill_rate
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= 1
+            if delay:
+                self.waited += delay
+                metrics.ratelimit_wait_seconds.inc(delay)
+            return delay
+
+
+class BucketLimiter:
+    """Per-route buckets plus a shared global bucket.
+
+    Routes are keyed the way Discord keys them, by their major parameter
+    (channel id for messages, guild id for member and role edits).
+    """
+
+    def __init__(self, rate: float, per: float = 1.0, global_bucket: Optional[TokenBucket] = None):
+        self.rate = rate
+        self.per = per
+        self.global_bucket = global_bucket
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+
+    async def acquire(self, key: Hashable = None) -> float:
+        waited = 0.0
+        if key is not None:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.per)
+            waited += await bucket.acquire()
+        if self.global_bucket is not None:
+            waited += await self.global_bucket.acquire()
+        return waited
+
+
+class OutboundScheduler:
+    """Global token bucket for every Discord HTTP request, served by priority.
+
+    A request takes a token straight away while nothing is queued. Otherwise
+    it queues under its priority class and guild, and one dispatcher task
+    hands out tokens as they refill: always to the most urgent class first,
+    and round-robin across guilds within a class, so a bulk job in one guild
+    neither delays moderation nor starves other guilds.
+
+    The bucket is per process: under the cluster launcher it refills at this
+    process's share of the token's global limit (GLOBAL_RATE).
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, per: float = 1.0):
+        self.capacity = rate
+        self.tokens = rate
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self._queues: List["OrderedDict[Hashable, Deque[asyncio.Future]]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._depth = [0] * len(PRIORITY_NAMES)
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        """Requests waiting for a token, in one priority class or overall."""
+        return sum(self._depth) if priority is None else self._depth[priority]
+
+    async def acquire(self, priority: Optional[int] = None, key: Hashable = None) -> float:
+        """Take one token, waiting behind more urgent requests. Returns the time waited.
+
+        Without a priority, the current task's request context is used.
+        """
+        if priority is None:
+            priority, context_key = _request_context.get()
+            key = context_key if key is None else key
+        self._refill()
+        if self.tokens >= 1 and not any(self._depth):
+            self.tokens -= 1
+            metrics.outbound_wait_seconds.observe(0.0, priority=PRIORITY_NAMES[priority])
+            return 0.0
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(key, deque()).append(waiter)
+        self._depth[priority] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+        delay = time.monotonic() - started
+        metrics.outbound_wait_seconds.observe(delay, priority=PRIORITY_NAMES[priority])
+        metrics.ratelimit_wait_seconds.inc(delay)
+        return delay
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for priority, queues in enumerate(self._queues):
+            while queues:
+                key, waiters = next(iter(queues.items()))
+                waiter = waiters.popleft()
+                self._depth[priority] -= 1
+                if waiters:
+                    queues.move_to_end(key)
+                else:
+                    del queues[key]
+                if not waiter.cancelled():
+                    return waiter
+        return None
+
+    async def _dispatch(self) -> None:
+        while any(self._depth):
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+                continue
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.tokens -= 1
+            waiter.set_result(None)
+
+    def install(self, http) -> None:
+        """Make every request on discord.py's HTTPClient wait for a token first."""
+        if getattr(http, "_outbound_wrapped", False):
+            return
+        request = http.request
+
+        async def scheduled_request(route, *args, **kwargs):
+            priority, guild_id = _request_context.get()
+            if guild_id is None:
+                guild_id = getattr(route, "guild_id", None)
+            await self.acquire(priority, guild_id)
+            return await request(route, *args, **kwargs)
+
+        http.request = scheduled_request
+        http._outbound_wrapped = True
+
+
+# Shared by every command and background job, so that together they stay
+# under the global limit and moderation always goes first.
+outbound = OutboundScheduler()
+
+
+def _collect_depth() -> None:
+    for priority, name in enumerate(PRIORITY_NAMES):
+        metrics.outbound_queue_depth.set(outbound.depth(priority), priority=name)
+
+
+metrics.register_collector(_collect_depth)
@@ -0,0 +1,434 @@
+import asyncio
+import os
+import time
+import discord
+from array import array
+from typing import Dict, Set, List, Optional, Iterable, FrozenSet, Tuple, Collection
+
+from utils import metrics
+from utils.member_cache import COMPACT
+
+# In lite member cache mode member updates are not dispatched for uncached
+# members, so the member index is re-fetched once it is older than this.
+MEMBER_INDEX_TTL = float(os.getenv("MEMBER_INDEX_TTL", "600"))
+
+# Per-guild role -> member id index, kept up to date from gateway events so
+# commands never have to scan guild.members to answer "who has this role?"
+# In lite mode only the member counts are kept (_role_counts).
+_role_members: Dict[int, Dict[int, Set[int]]] = {}
+_role_counts: Dict[int, Dict[int, int]] = {}
+
+# Per-guild member id -> role ids, the inverse of the above. A frozenset per
+# member normally, a packed sorted array('Q') in lite mode.
+_member_roles: Dict[int, Dict[int, Collection[int]]] = {}
+
+# When each guild's member index was last known to be complete.
+_indexed_at: Dict[int, float] = {}
+# Guilds whose member index was loaded from a saved snapshot (see warm_state)
+# and not yet rebuilt from the gateway, with the time the snapshot was saved.
+_warm: Dict[int, float] = {}
+_index_locks: Dict[int, asyncio.Lock] = {}
+
+# Per-guild role name -> role ids, exact and casefolded. Names are not unique
+# in Discord, so every name maps to a list of ids.
+_role_names: Dict[int, Dict[str, List[int]]] = {}
+_role_names_folded: Dict[int, Dict[str, List[int]]] = {}
+
+# Per-guild role id -> position.
+_role_positions: Dict[int, Dict[int, int]] = {}
+
+# (guild id, role name) -> role id for the roles gating special commands.
+_gate_roles: Dict[Tuple[int, str], int] = {}
+
+
+def _member_role_ids(member: discord.Member) -> Iterable[int]:
+    """Role ids held by a member, excluding @everyone."""
+    return member._roles
+
+
+def _pack(role_ids: FrozenSet[int]) -> Collection[int]:
+    return array('Q', sorted(role_ids)) if COMPACT else role_ids
+
+
+def _set_member_roles(guild_id: int, member_id: int, role_ids: Optional[Iterable[int]]) -> None:
+    """Store a member's role ids (None forgets the member) and relink roles."""
+    members = _member_roles.get(guild_id)
+    if members is None:
+        return
+    old_roles = frozenset(members.get(member_id, ()))
+    new_roles = frozenset(role_ids or ())
+    if role_ids is None:
+        members.pop(member_id, None)
+    elif member_id not in members or old_roles != new_roles:
+        members[member_id] = _pack(new_roles)
+    if old_roles == new_roles:
+        return
+    if COMPACT:
+        counts = _role_counts[guild_id]
+        for role_id in old_roles - new_roles:
+            counts[role_id] = max(0, counts.get(role_id, 0) - 1)
+        for role_id in new_roles - old_roles:
+            counts[role_id] = counts.get(role_id, 0) + 1
+    else:
+        index = _role_members[guild_id]
+        for role_id in old_roles - new_roles:
+            index.get(role_id, set()).discard(member_id)
+        for role_id in new_roles - old_roles:
+            index.setdefault(role_id, set()).add(member_id)
+
+
+def _index_members(guild_id: int, members: Iterable[Tuple[int, Iterable[int]]]) -> None:
+    """Replace a guild's member index with (member id, role ids) pairs."""
+    _member_roles[guild_id] = {}
+    _role_members[guild_id] = {}
+    _role_counts[guild_id] = {}
+    if COMPACT:
+        _role_members.pop(guild_id)
+    else:
+        _role_counts.pop(guild_id)
+    for member_id, role_ids in members:
+        _set_member_roles(guild_id, member_id, role_ids)
+
+
+def _reconcile_warm(guild: discord.Guild) -> None:
+    """Bring a snapshot-loaded index in line with what the gateway already sent.
+
+    Roles deleted since the snapshot are dropped, and cached members (whose
+    roles are current) overwrite their snapshot entries.
+    """
+    known = {role.id for role in guild.roles}
+    members = _member_roles[guild.id]
+    for member_id, role_ids in list(members.items()):
+        if not known.issuperset(role_ids):
+            _set_member_roles(guild.id, member_id, known.intersection(role_ids))
+    for member in guild.members:
+        _set_member_roles(guild.id, member.id, _member_role_ids(member))
+
+
+def build_guild_index(guild: discord.Guild) -> None:
+    """(Re)build every index for a guild from its role and member cache.
+
+    In lite mode there is no member cache to build from, so the member index
+    is left to ensure_member_index(). A snapshot-loaded index is kept and
+    reconciled until the guild has been fully chunked.
+    """
+    if guild.id in _warm and (COMPACT or not guild.chunked):
+        _reconcile_warm(guild)
+    elif not COMPACT:
+        _index_members(guild.id, ((member.id, _member_role_ids(member)) for member in guild.members))
+        _warm.pop(guild.id, None)
+        if guild.chunked:
+            _indexed_at[guild.id] = time.monotonic()
+    elif guild.id not in _member_roles:
+        _index_members(guild.id, ())
+    build_role_index(guild)
+
+
+async def ensure_member_index(guild: discord.Guild, allow_warm: bool = True) -> None:
+    """Make sure the member index is complete before relying on counts.
+
+    With the full member cache this only chunks a guild that was never
+    chunked. In lite mode members are streamed from the API into the compact
+    index (no Member objects are kept) when the index is missing or stale.
+
+    Destructive operations pass allow_warm=False to wait for live data: a
+    snapshot-loaded index no longer counts as complete, and in lite mode the
+    members are always fetched again, since role changes made elsewhere to
+    uncached members never reach the index.
+    """
+    indexed_at = _indexed_at.get(guild.id)
+    if COMPACT:
+        fresh = allow_warm and indexed_at is not None and time.monotonic() - indexed_at < MEMBER_INDEX_TTL
+    else:
+        fresh = indexed_at is not None and (allow_warm or guild.id not in _warm)
+    if fresh:
+        return
+    lock = _index_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
+        if _indexed_at.get(guild.id) != indexed_at:
+            return
+        if not COMPACT:
+            if not guild.chunked:
+                await guild.chunk()
+            build_guild_index(guild)
+            _indexed_at[guild.id] = time.monotonic()
+            return
+        fetched = []
+        async for member in guild.fetch_members(limit=None):
+            fetched.append((member.id, array('Q', sorted(_member_role_ids(member)))))
+        _index_members(guild.id, fetched)
+        _indexed_at[guild.id] = time.monotonic()
+        _warm.pop(guild.id, None)
+
+
+def index_age(guild_id: int) -> Optional[float]:
+    """Seconds since the guild's member index was last complete, if ever."""
+    indexed_at = _indexed_at.get(guild_id)
+    return None if indexed_at is None else time.monotonic() - indexed_at
+
+
+def load_warm_index(guild_id: int, members: Iterable[Tuple[int, Iterable[int]]], saved_at: float) -> bool:
+    """Seed a guild's member index from a snapshot saved at `saved_at` (wall clock).
+
+    Ignored once the guild has live data. The index counts as having been
+    complete when the snapshot was saved, so lite mode refetches it once it
+    is older than MEMBER_INDEX_TTL.
+    """
+    if guild_id in _indexed_at:
+        return False
+    _index_members(guild_id, members)
+    _indexed_at[guild_id] = time.monotonic() - max(0.0, time.time() - saved_at)
+    _warm[guild_id] = saved_at
+    return True
+
+
+def warm_age(guild_id: int) -> Optional[float]:
+    """Age of the snapshot a guild's index still comes from, or None if it is live."""
+    saved_at = _warm.get(guild_id)
+    return None if saved_at is None else time.time() - saved_at
+
+
+def warm_guilds() -> List[int]:
+    return list(_warm)
+
+
+def export_members(guild_id: int) -> Optional[List[Tuple[int, Collection[int]]]]:
+    """(member id, role ids) pairs of a guild's member index, for warm_state."""
+    members = _member_roles.get(guild_id)
+    return None if members is None else list(members.items())
+
+
+def build_role_index(guild: discord.Guild) -> None:
+    """(Re)build the role name and position indexes for a guild."""
+    names: Dict[str, List[int]] = {}
+    folded: Dict[str, List[int]] = {}
+    positions: Dict[int, int] = {}
+    for role in guild.roles:
+        names.setdefault(role.name, []).append(role.id)
+        folded.setdefault(role.name.casefold(), []).append(role.id)
+        positions[role.id] = role.position
+    _role_names[guild.id] = names
+    _role_names_folded[guild.id] = folded
+    _role_positions[guild.id] = positions
+    _forget_gates(guild.id)
+
+
+def drop_guild(guild_id: int) -> None:
+    """Forget everything cached for a guild."""
+    _role_members.pop(guild_id, None)
+    _role_counts.pop(guild_id, None)
+    _member_roles.pop(guild_id, None)
+    _indexed_at.pop(guild_id, None)
+    _warm.pop(guild_id, None)
+    _role_names.pop(guild_id, None)
+    _role_names_folded.pop(guild_id, None)
+    _role_positions.pop(guild_id, None)
+    _forget_gates(guild_id)
+
+
+def _forget_gates(guild_id: int, role_id: Optional[int] = None) -> None:
+    for key in [k for k, v in _gate_roles.items() if k[0] == guild_id and role_id in (None, v)]:
+        del _gate_roles[key]
+
+
+def _ensure_index(guild: discord.Guild) -> None:
+    if guild.id not in _member_roles:
+        build_guild_index(guild)
+
+
+def role_members(guild: discord.Guild, role_id: int) -> Set[int]:
+    """Ids of the members holding a role. Do not mutate the returned set."""
+    _ensure_index(guild)
+    if COMPACT:
+        return {member_id for member_id, role_ids in _member_roles[guild.id].items() if role_id in role_ids}
+    return _role_members[guild.id].get(role_id, set())
+
+
+def member_count(guild: discord.Guild, role_id: int) -> int:
+    """Number of members holding a role."""
+    _ensure_index(guild)
+    if COMPACT:
+        return _role_counts[guild.id].get(role_id, 0)
+    return len(_role_members[guild.id].get(role_id, ()))
+
+
+def member_role_ids(member: discord.Member) -> FrozenSet[int]:
+    """Role ids held by a member as a frozenset, from the cache when possible.
+
+    In lite mode the Member object (fresh from the gateway or API) is the
+    better source, and it is used to refresh the compact index.
+    """
+    members = _member_roles.get(member.guild.id)
+    if COMPACT:
+        role_ids = frozenset(_member_role_ids(member))
+        if members is not None:
+            _set_member_roles(member.guild.id, member.id, role_ids)
+        return role_ids
+    if members is None:
+        metrics.cache_requests_total.inc(cache="member_roles", result="miss")
+        return frozenset(_member_role_ids(member))
+    role_ids = members.get(member.id)
+    if role_ids is None:
+        metrics.cache_requests_total.inc(cache="member_roles", result="miss")
+        role_ids = frozenset(_member_role_ids(member))
+        _set_member_roles(member.guild.id, member.id, role_ids)
+    else:
+        metrics.cache_requests_total.inc(cache="member_roles", result="hit")
+    return role_ids
+
+
+def cached_role_ids(guild: discord.Guild, member_id: int) -> Optional[Collection[int]]:
+    """Cached role ids for a member id, or None if the member is not indexed."""
+    _ensure_index(guild)
+    return _member_roles[guild.id].get(member_id)
+
+
+def apply_role_delta(guild_id: int, member_id: int, added: Iterable[int] = (), removed: Iterable[int] = ()) -> None:
+    """Record role changes the bot made itself.
+
+    Needed in lite mode, where no member update event arrives for uncached
+    members; harmless otherwise since the event carries the same change.
+    """
+    members = _member_roles.get(guild_id)
+    if members is None or member_id not in members:
+        return
+    _set_member_roles(guild_id, member_id, (set(members[member_id]) | set(added)) - set(removed))
+
+
+def add_member(member: discord.Member) -> None:
+    _set_member_roles(member.guild.id, member.id, frozenset(_member_role_ids(member)))
+
+
+def forget_member(guild_id: int, member_id: int) -> None:
+    _set_member_roles(guild_id, member_id, None)
+
+
+def update_member(before: discord.Member, after: discord.Member) -> None:
+    """Apply the role delta between two versions of a member."""
+    _set_member_roles(after.guild.id, after.id, frozenset(_member_role_ids(after)))
+
+
+def _index_name(guild_id: int, name: str, role_id: int) -> None:
+    names = _role_names.get(guild_id)
+    if names is None:
+        return
+    names.setdefault(name, []).append(role_id)
+    _role_names_folded[guild_id].setdefault(name.casefold(), []).append(role_id)
+
+
+def _unindex_name(guild_id: int, name: str, role_id: int) -> None:
+    for index, key in ((_role_names, name), (_role_names_folded, name.casefold())):
+        names = index.get(guild_id)
+        if names is None or key not in names:
+            continue
+        ids = names[key]
+        if role_id in ids:
+            ids.remove(role_id)
+        if not ids:
+            del names[key]
+
+
+def add_role(role: discord.Role) -> None:
+    index = _role_members.get(role.guild.id)
+    if index is not None:
+        index.setdefault(role.id, set())
+    positions = _role_positions.get(role.guild.id)
+    if positions is not None:
+        positions[role.id] = role.position
+    _index_name(role.guild.id, role.name, role.id)
+
+
+def update_role(before: discord.Role, after: discord.Role) -> None:
+    positions = _role_positions.get(after.guild.id)
+    if positions is not None:
+        positions[after.id] = after.position
+    if before.name != after.name:
+        _unindex_name(after.guild.id, before.name, after.id)
+        _index_name(after.guild.id, after.name, after.id)
+        _forget_gates(after.guild.id, after.id)
+
+
+def remove_role(role: discord.Role) -> Optional[Set[int]]:
+    """Drop a deleted role from the index, returning its former members."""
+    _unindex_name(role.guild.id, role.name, role.id)
+    _forget_gates(role.guild.id, role.id)
+    positions = _role_positions.get(role.guild.id)
+    if positions is not None:
+        positions.pop(role.id, None)
+    members = _member_roles.get(role.guild.id)
+    if members is None:
+        return None
+    former = set(role_members(role.guild, role.id))
+    for member_id in former:
+        _set_member_roles(role.guild.id, member_id, set(members[member_id]) - {role.id})
+    if COMPACT:
+        _role_counts[role.guild.id].pop(role.id, None)
+    else:
+        _role_members[role.guild.id].pop(role.id, None)
+    return former
+
+
+def resolve_roles(guild: discord.Guild, name: str, exact: bool = True) -> List[discord.Role]:
+    """All roles called `name`, lowest position first.
+
+    With exact=False the comparison is case-insensitive.
+    """
+    if guild.id not in _role_names:
+        metrics.cache_requests_total.inc(cache="role_names", result="miss")
+        build_role_index(guild)
+    else:
+        metrics.cache_requests_total.inc(cache="role_names", result="hit")
+    if exact:
+        ids = _role_names[guild.id].get(name, ())
+    else:
+        ids = _role_names_folded[guild.id].get(name.casefold(), ())
+    roles = [role for role in map(guild.get_role, ids) if role is not None]
+    if len(roles) > 1:
+        roles.sort()
+    return roles
+
+
+def resolve_role(guild: discord.Guild, name: str, exact: Optional[bool] = None) -> Optional[discord.Role]:
+    """Look up a role by name in constant time.
+
+    exact=True only accepts the exact name, exact=False matches ignoring case.
+    By default an exact match is preferred, falling back to a case-insensitive
+    match only when that is unambiguous. Duplicate names resolve to the lowest
+    role, like discord.utils.get(guild.roles, name=...).
+    """
+    if exact is not None:
+        roles = resolve_roles(guild, name, exact)
+        return roles[0] if roles else None
+    roles = resolve_roles(guild, name, True)
+    if roles:
+        return roles[0]
+    roles = resolve_roles(guild, name, False)
+    return roles[0] if len(roles) == 1 else None
+
+
+def gate_role_id(guild: discord.Guild, name: str) -> Optional[int]:
+    """Id of the role gating a command, resolved once per guild and cached."""
+    key = (guild.id, name)
+    role_id = _gate_roles.get(key)
+    metrics.cache_requests_total.inc(cache="gate_roles", result="miss" if role_id is None else "hit")
+    if role_id is None:
+        role = resolve_role(guild, name, exact=True)
+        if role is None:
+            return None
+        role_id = _gate_roles[key] = role.id
+    return role_id
+
+
+def role_position(guild: discord.Guild, role_id: int) -> int:
+    """Cached position of a role, or -1 if it is unknown."""
+    if guild.id not in _role_positions:
+        build_role_index(guild)
+    return _role_positions[guild.id].get(role_id, -1)
+
+
+def top_position(member: discord.Member) -> int:
+    """Position of the member's highest role (0 for @everyone only)."""
+    if member.guild.id not in _role_positions:
+        build_role_index(member.guild)
+    positions = _role_positions[member.guild.id]
+    return max((positions.get(role_id, 0) for role_id in member_role_ids(member)), default=0)
@@ -1,8 +1,10 @@
 import discord
 from typing import Optional, Dict, List, Tuple
 import re
+from datetime import timedelta
 from discord.ext import commands
-from functools import wraps
+from functools import wraps, lru_cache
+from utils import role_cache
 
 # Predefined role templates with their configurations
 role_templates = {
@@ -86,43 +88,117 @@ def parse_color(color_str: str) -> discord.Color:
 
     return discord.Color.default()
 
-def parse_permissions(permission_str: str) -> Dict[str, bool]:
-    """Convert permission string to dictionary of permissions."""
-    available_permissions = {
-        "admin": "administrator",
-        "kick": "kick_members",
-        "ban": "ban_members",
-        "manage_roles": "manage_roles",
-        "manage_channels": "manage_channels",
-        "manage_messages": "manage_messages",
-        "mention_everyone": "mention_everyone",
-        "mute": "mute_members",
-        "deafen": "deafen_members",
-        "move": "move_members",
-        "view_channels": "view_channels",
-        "send_messages": "send_messages",
-        "read_messages": "read_messages",
-        "attach_files": "attach_files",
-        "add_reactions": "add_reactions"
-    }
+# Every Discord permission flag (including discord.py's aliases such as
+# read_messages) mapped to its bit, computed once at import.
+PERMISSION_BITS: Dict[str, int] = dict(discord.Permissions.VALID_FLAGS)
+
+# Short names accepted in perm strings on top of the flag names themselves.
+PERMISSION_ALIASES: Dict[str, str] = {
+    "admin": "administrator",
+    "kick": "kick_members",
+    "ban": "ban_members",
+    "mute": "mute_members",
+    "deafen": "deafen_members",
+    "move": "move_members",
+    "timeout": "moderate_members",
+    "view_channels": "view_channel",
+    "nick": "change_nickname",
+    "nicknames": "manage_nicknames",
+    "webhooks": "manage_webhooks",
+    "emojis": "manage_emojis",
+}
+
+# Named groups of permissions usable like a single permission.
+PERMISSION_GROUPS: Dict[str, List[str]] = {
+    "basic": ["view_channel", "send_messages", "read_message_history", "add_reactions"],
+    "moderation": ["kick_members", "ban_members", "manage_messages", "mute_members",
+                   "deafen_members", "move_members", "moderate_members"],
+    "voice": ["connect", "speak", "stream", "use_voice_activation"],
+}
+
+PERMISSION_MASKS: Dict[str, int] = {name: bit for name, bit in PERMISSION_BITS.items()}
+PERMISSION_MASKS.update({alias: PERMISSION_BITS[name] for alias, name in PERMISSION_ALIASES.items()
+                         if name in PERMISSION_BITS})
+for _group, _names in PERMISSION_GROUPS.items():
+    PERMISSION_MASKS[_group] = 0
+    for _name in _names:
+        PERMISSION_MASKS[_group] |= PERMISSION_BITS.get(_name, 0)
+PERMISSION_MASKS["all"] = discord.Permissions.all().value
+
+
+class UnknownPermissionError(ValueError):
+    """Raised when a permission string names permissions that don't exist."""
 
-    permissions = {}
-    perms = permission_str.lower().split(',')
+    def __init__(self, names: List[str]):
+        self.names = names
+        super().__init__(f"Unknown permission(s): {', '.join(names)}")
 
-    for perm in perms:
+
+@lru_cache(maxsize=256)
+def _parse_permission_value(permission_str: str) -> int:
+    value = 0
+    unknown = []
+    for perm in permission_str.split(','):
         perm = perm.strip()
-        if perm.startswith('-'):
-            perm = perm[1:]
-            value = False
+        if not perm:
+            continue
+        negate = perm.startswith('-')
+        if negate:
+            perm = perm[1:].strip()
+        mask = PERMISSION_MASKS.get(perm)
+        if mask is None:
+            unknown.append(perm)
+        elif negate:
+            value &= ~mask
         else:
-            value = True
+            value |= mask
+    if unknown:
+        raise UnknownPermissionError(unknown)
+    return value
+
+def parse_permissions(permission_str: str) -> int:
+    """Convert a permission string to a permission bitfield.
+
+    Entries are applied left to right, so "all,-admin" or "moderation,-ban"
+    work as expected. Raises UnknownPermissionError for unknown names.
+    """
+    return _parse_permission_value(permission_str.lower())
+
+def permission_names(value: int) -> List[str]:
+    """Names of the permissions set in a bitfield."""
+    return [name for name, enabled in discord.Permissions(value) if enabled]
 
-        if perm in available_permissions:
-            permissions[available_permissions[perm]] = value
+def compile_permissions(permissions: Dict[str, bool]) -> int:
+    """Convert a {permission: enabled} dict to a bitfield."""
+    value = 0
+    for name, enabled in permissions.items():
+        if enabled:
+            value |= PERMISSION_MASKS[PERMISSION_ALIASES.get(name, name)]
+    return value
 
-    return permissions
+# Template permissions are written as dicts for readability and compiled to
+# bitfields once here, so creating a role never has to convert them.
+for _template in role_templates.values():
+    _template["permissions"] = compile_permissions(_template["permissions"])
 
-def format_role_info(role: discord.Role) -> str:
+def parse_duration(duration_str: str) -> Optional[timedelta]:
+    """Convert a duration like 90s, 30m, 2h or 7d to a timedelta."""
+    match = re.match(r'^(\d+)\s*([smhd])$', duration_str.strip().lower())
+    if not match:
+        return None
+    unit = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+    return timedelta(**{unit: int(match.group(1))})
+
+def split_duration_suffix(text: str) -> Tuple[str, Optional[timedelta]]:
+    """Split a trailing "for <duration>" off a command argument."""
+    match = re.match(r'^(.*\S)\s+for\s+(\S+)$', text.strip(), re.IGNORECASE)
+    if match:
+        duration = parse_duration(match.group(2))
+        if duration:
+            return match.group(1), duration
+    return text, None
+
+def format_role_info(role: discord.Role, member_count: Optional[int] = None) -> str:
     """Format role information for display."""
     info = [
         f"Role: {role.name}",
@@ -131,8 +207,10 @@ def format_role_info(role: discord.Role) -> str:
         f"Position: {role.position}",
         f"Mentionable: {role.mentionable}",
         f"Hoisted: {role.hoist}",
-        "\nPermissions:"
     ]
+    if member_count is not None:
+        info.append(f"Members: {member_count}")
+    info.append("\nPermissions:")
 
     for perm, value in role.permissions:
         if value:
@@ -140,25 +218,30 @@ def format_role_info(role: discord.Role) -> str:
 
     return "\n".join(info)
 
-def get_template_info() -> str:
+def get_template_info(templates: Optional[Dict[str, dict]] = None) -> str:
     """Get information about available role templates."""
     info = ["Available Role Templates:"]
-    for name, template in role_templates.items():
+    for name, template in (templates or role_templates).items():
         info.append(f"\n{name.replace('_', ' ').title()}:")
         info.append(f"Description: {template['description']}")
-        info.append("Key Permissions: " + ", ".join(
-            [k for k, v in template['permissions'].items() if v]
-        ))
+        info.append("Key Permissions: " + ", ".join(permission_names(template['permissions'])))
     return "\n".join(info)
 
-def has_role_permission(role_name: str):
-    """Decorator to check if user has the required role."""
+def has_role_permission(role_name: str, or_above: bool = False):
+    """Decorator to check if user has the required role.
+
+    With or_above=True, holding any role positioned at or above it also passes.
+    """
     async def predicate(ctx):
-        role = discord.utils.get(ctx.guild.roles, name=role_name)
-        if not role:
+        if ctx.guild is None:
+            return False
+        role_id = role_cache.gate_role_id(ctx.guild, role_name)
+        if role_id is None:
             await ctx.send(f"The {role_name} role doesn't exist in this server!")
             return False
-        return role in ctx.author.roles
+        if or_above:
+            return role_cache.top_position(ctx.author) >= role_cache.role_position(ctx.guild, role_id)
+        return role_id in role_cache.member_role_ids(ctx.author)
     return commands.check(predicate)
 
 def get_role_commands_info() -> str:
@@ -170,14 +253,16 @@ def get_role_commands_info() -> str:
         "!knightannounce [message] - Send an announcement with special formatting",
         "!knightmute @user [duration] - Temporarily mute a user",
 
-        "\nKing Commands:",
+        "\nKing Commands (King or any role above it):",
         "!kingdecree [message] - Make a server-wide decree",
         "!kingrename @user [new_name] - Rename a user",
         "!kingexile @user - Kick a user from the server",
+        "!kingexilemany [targets] - Kick many users (mentions, ids, joined:10m)",
 
-        "\nGod Commands:",
+        "\nGod Commands (God or any role above it):",
         "!godsmite @user - Ban a user dramatically",
-        "!godblessing @user - Grant a random special permission",
+        "!godsmitemany [targets] - Ban many users at once (mentions, ids, joined:10m)",
+        "!godblessing @user [for 2h] - Grant a random special permission",
         "!godspeak [message] - Send a divine message to all channels"
     ])
 
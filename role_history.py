@@ -0,0 +1,123 @@
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Iterable, List, Optional
+
+import discord
+
+from utils.storage import ensure_schema
+
+# Creations remembered per guild, and how many guilds are kept in memory.
+HISTORY_SIZE = int(os.getenv("ROLE_HISTORY_SIZE", "25"))
+HISTORY_GUILDS = int(os.getenv("ROLE_HISTORY_GUILDS", "500"))
+# ROLE_HISTORY_PERSIST=1 keeps the history in SQLite across restarts.
+PERSIST = os.getenv("ROLE_HISTORY_PERSIST", "0") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS role_history (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    color INTEGER NOT NULL,
+    permissions INTEGER NOT NULL,
+    hoist INTEGER NOT NULL,
+    mentionable INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (guild_id, role_id)
+);
+CREATE INDEX IF NOT EXISTS role_history_recent ON role_history (guild_id, created_at);
+"""
+
+
+@dataclass
+class RoleRecord:
+    """A role the bot created: its id and the parameters it was created with."""
+    role_id: int
+    name: str
+    color: int
+    permissions: int
+    hoist: bool
+    mentionable: bool
+    source: str
+    created_at: float
+
+
+class RoleHistory:
+    """Bounded per-guild history of created roles.
+
+    Only ids and creation parameters are kept, never live Role objects. Each
+    guild keeps its last HISTORY_SIZE creations and the least recently used
+    guilds are evicted from memory beyond HISTORY_GUILDS.
+    """
+
+    def __init__(self, size: int = HISTORY_SIZE, max_guilds: int = HISTORY_GUILDS, persist: bool = PERSIST):
+        self.size = size
+        self.max_guilds = max_guilds
+        self.persist = persist
+        self._guilds: "OrderedDict[int, Deque[RoleRecord]]" = OrderedDict()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = ensure_schema(SCHEMA)
+        return self._conn
+
+    def _history(self, guild_id: int) -> Deque[RoleRecord]:
+        history = self._guilds.get(guild_id)
+        if history is None:
+            history = deque(maxlen=self.size)
+            if self.persist:
+                rows = self._db().execute(
+                    "SELECT * FROM role_history WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?",
+                    (guild_id, self.size),
+                ).fetchall()
+                for row in reversed(rows):
+                    history.append(RoleRecord(row["role_id"], row["name"], row["color"], row["permissions"],
+                                              bool(row["hoist"]), bool(row["mentionable"]),
+                                              row["source"], row["created_at"]))
+            self._guilds[guild_id] = history
+            if len(self._guilds) > self.max_guilds:
+                self._guilds.popitem(last=False)
+        else:
+            self._guilds.move_to_end(guild_id)
+        return history
+
+    def record(self, role: discord.Role, source: str) -> None:
+        entry = RoleRecord(role.id, role.name, role.color.value, role.permissions.value,
+                           role.hoist, role.mentionable, source, time.time())
+        self._history(role.guild.id).append(entry)
+        if self.persist:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO role_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (role.guild.id, entry.role_id, entry.name, entry.color, entry.permissions,
+                 int(entry.hoist), int(entry.mentionable), entry.source, entry.created_at),
+            )
+            conn.execute(
+                "DELETE FROM role_history WHERE guild_id = ? AND role_id NOT IN "
+                "(SELECT role_id FROM role_history WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?)",
+                (role.guild.id, role.guild.id, self.size),
+            )
+
+    def recent(self, guild_id: int, count: Optional[int] = None) -> List[RoleRecord]:
+        """The most recent creations, newest first."""
+        entries = list(reversed(self._history(guild_id)))
+        return entries if count is None else entries[:count]
+
+    def forget(self, guild_id: int, role_ids: Iterable[int]) -> None:
+        role_ids = set(role_ids)
+        if not role_ids:
+            return
+        history = self._guilds.get(guild_id)
+        if history is not None:
+            kept = [entry for entry in history if entry.role_id not in role_ids]
+            history.clear()
+            history.extend(kept)
+        if self.persist:
+            self._db().executemany("DELETE FROM role_history WHERE guild_id = ? AND role_id = ?",
+                                   [(guild_id, role_id) for role_id in role_ids])
+
+
+role_history = RoleHistory()
@@ -0,0 +1,114 @@
+import discord
+from typing import Dict, List, Optional, Sequence
+
+
+class PositionError(Exception):
+    """Raised when a requested move is impossible or not allowed for the bot."""
+
+
+def plan_move(
+    roles: Sequence[discord.Role],
+    moving: Sequence[discord.Role],
+    direction: str,
+    amount: Optional[int] = None,
+    reference: Optional[discord.Role] = None,
+    ceiling: Optional[discord.Role] = None,
+) -> Dict[discord.Role, int]:
+    """Work out the smallest position update for moving one or more roles.
+
+    `roles` is guild.roles (lowest first). The moved roles keep their relative
+    order and end up next to each other. direction is one of up/down (by
+    `amount` slots), over/under (`reference`), top or bottom. `ceiling` is the
+    bot's top role: nothing may be moved to or from above it, and "top" means
+    directly below it.
+
+    Only roles whose slot actually changes are returned. Each takes the old
+    position of the slot it moves into, so gaps in the position numbering
+    are preserved and untouched roles are never sent.
+    """
+    if not moving:
+        raise PositionError("No roles to move.")
+    index_of = {role.id: i for i, role in enumerate(roles)}
+    moving_ids = {role.id for role in moving}
+    moving = sorted(moving, key=lambda role: index_of[role.id])
+    if roles and roles[0].id in moving_ids:
+        raise PositionError("The @everyone role cannot be moved.")
+    if reference is not None and reference.id in moving_ids:
+        raise PositionError("A role cannot be moved relative to itself.")
+    remaining = [role for role in roles if role.id not in moving_ids]
+    remaining_index = {role.id: i for i, role in enumerate(remaining)}
+
+    top_slot = len(remaining)
+    if ceiling is not None:
+        if ceiling.id in moving_ids or any(index_of[role.id] > index_of[ceiling.id] for role in moving):
+            raise PositionError(f"I can only move roles below my highest role ({ceiling.name}).")
+        top_slot = remaining_index[ceiling.id]
+
+    # Slot in `remaining` the moved block is inserted before. Nothing being
+    # moved sits below moving[0], so its old index is its current slot.
+    current = index_of[moving[0].id]
+    if direction == "up" and amount:
+        slot = current + amount
+    elif direction == "down" and amount:
+        slot = current - amount
+    elif direction == "over" and reference is not None:
+        slot = remaining_index[reference.id] + 1
+    elif direction == "under" and reference is not None:
+        slot = remaining_index[reference.id]
+    elif direction == "top":
+        slot = top_slot
+    elif direction == "bottom":
+        slot = 1
+    else:
+        raise PositionError("Invalid command usage.")
+
+    if slot > top_slot:
+        if direction in ("up", "top"):
+            slot = top_slot
+        else:
+            raise PositionError(f"I can only move roles below my highest role ({ceiling.name}).")
+    slot = max(1, slot)
+
+    new_order: List[discord.Role] = remaining[:slot] + list(moving) + remaining[slot:]
+    return {
+        role: roles[i].position
+        for i, role in enumerate(new_order)
+        if roles[i].id != role.id
+    }
+
+
+def plan_reorder(roles: Sequence[discord.Role], ordered: Sequence[discord.Role]) -> Dict[discord.Role, int]:
+    """Positions putting `ordered` (lowest first) in that order among the slots they occupy.
+
+    As in plan_move, each role takes the old position of the slot it moves
+    into and only roles whose slot changes are returned, so gaps and roles
+    outside `ordered` are left alone.
+    """
+    index_of = {role.id: i for i, role in enumerate(roles)}
+    slots = sorted(index_of[role.id] for role in ordered)
+    return {role: roles[slot].position for role, slot in zip(ordered, slots) if roles[slot].id != role.id}
+
+
+def parse_move_direction(text: str):
+    """Parse the tail of a move command.
+
+    Accepts "move up 2", "move down 3", "move over Name", "move under Name",
+    "moveto top" and "moveto bottom" (the leading "move" is optional).
+    Returns (direction, amount, reference name) or None.
+    """
+    parts = text.split()
+    if parts and parts[0].lower() == "move":
+        parts = parts[1:]
+    if not parts:
+        return None
+    keyword = parts[0].lower()
+    if keyword in ("up", "down"):
+        amount = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+        return keyword, amount, None
+    if keyword in ("over", "under") and len(parts) > 1:
+        return keyword, None, " ".join(parts[1:])
+    if keyword == "moveto" and len(parts) > 1 and parts[1].lower() in ("top", "bottom"):
+        return parts[1].lower(), None, None
+    if keyword in ("top", "bottom"):
+        return keyword, None, None
+    return None
@@ -0,0 +1,155 @@
+import fnmatch
+import re
+from typing import Dict, List, Optional, Set
+
+import discord
+
+# Per-guild trigram -> role ids over casefolded role names, plus the folded
+# names themselves. Names are padded ("  name ") so short names and word
+# starts still produce trigrams for fuzzy matching.
+_trigrams: Dict[int, Dict[str, Set[int]]] = {}
+_names: Dict[int, Dict[int, str]] = {}
+
+
+def _grams(text: str, padded: bool = True) -> Set[str]:
+    if padded:
+        text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_index(guild: discord.Guild) -> None:
+    _trigrams[guild.id] = {}
+    _names[guild.id] = {}
+    for role in guild.roles[1:]:  # Skip @everyone role
+        add_role(role)
+
+
+def drop_guild(guild_id: int) -> None:
+    _trigrams.pop(guild_id, None)
+    _names.pop(guild_id, None)
+
+
+def add_role(role: discord.Role) -> None:
+    names = _names.get(role.guild.id)
+    if names is None or role.is_default():
+        return
+    folded = role.name.casefold()
+    names[role.id] = folded
+    trigrams = _trigrams[role.guild.id]
+    for gram in _grams(folded):
+        trigrams.setdefault(gram, set()).add(role.id)
+
+
+def remove_role(role: discord.Role) -> None:
+    names = _names.get(role.guild.id)
+    if names is None or role.id not in names:
+        return
+    trigrams = _trigrams[role.guild.id]
+    for gram in _grams(names.pop(role.id)):
+        ids = trigrams.get(gram)
+        if ids is not None:
+            ids.discard(role.id)
+            if not ids:
+                del trigrams[gram]
+
+
+def update_role(before: discord.Role, after: discord.Role) -> None:
+    if before.name != after.name:
+        remove_role(before)
+        add_role(after)
+
+
+def _ensure(guild: discord.Guild) -> None:
+    if guild.id not in _names:
+        build_index(guild)
+
+
+def _candidates(guild_id: int, literals: List[str]) -> Optional[Set[int]]:
+    """Role ids containing every trigram of the literals, or None if no literal has one."""
+    grams: Set[str] = set()
+    for literal in literals:
+        grams |= _grams(literal, padded=False)
+    if not grams:
+        return None
+    trigrams = _trigrams[guild_id]
+    sets = sorted((trigrams.get(gram, set()) for gram in grams), key=len)
+    result = set(sets[0])
+    for ids in sets[1:]:
+        if not result:
+            break
+        result &= ids
+    return result
+
+
+def _roles(guild: discord.Guild, ids) -> List[discord.Role]:
+    return sorted(role for role in map(guild.get_role, ids) if role is not None)
+
+
+def substring(guild: discord.Guild, text: str) -> List[discord.Role]:
+    """Roles whose name contains `text`, ignoring case."""
+    _ensure(guild)
+    text = text.casefold()
+    names = _names[guild.id]
+    candidates = _candidates(guild.id, [text])
+    ids = names if candidates is None else candidates
+    return _roles(guild, [role_id for role_id in ids if text in names[role_id]])
+
+
+def complete(guild: discord.Guild, text: str, limit: int = 25) -> List[str]:
+    """Role names for autocomplete: prefix matches first, then substring matches, highest role first."""
+    _ensure(guild)
+    folded = text.strip().casefold()
+    if len(folded) >= 3:
+        roles = substring(guild, folded)
+    else:
+        roles = _roles(guild, [role_id for role_id, name in _names[guild.id].items() if folded in name])
+    roles.sort(key=lambda role: (not role.name.casefold().startswith(folded), -role.position))
+    return [role.name for role in roles[:limit]]
+
+
+def select(guild: discord.Guild, pattern: str) -> List[discord.Role]:
+    """Roles matching a pattern, ignoring case.
+
+    "re:<regex>" is a regular expression, a pattern containing * ? or [ is a
+    glob over the whole name, and anything else is a substring match.
+    Raises re.error for invalid regular expressions.
+    """
+    _ensure(guild)
+    names = _names[guild.id]
+    if pattern.lower().startswith("re:"):
+        regex = re.compile(pattern[3:], re.IGNORECASE)
+        return _roles(guild, [role_id for role_id, name in names.items() if regex.search(name)])
+    if not any(c in pattern for c in "*?["):
+        return substring(guild, pattern)
+    folded = pattern.casefold()
+    regex = re.compile(fnmatch.translate(folded))
+    literals = [part for part in re.split(r"[*?]|\[[^\]]*\]", folded) if len(part) >= 3]
+    candidates = _candidates(guild.id, literals)
+    ids = names if candidates is None else candidates
+    return _roles(guild, [role_id for role_id in ids if regex.match(names[role_id])])
+
+
+def suggest(guild: discord.Guild, name: str, limit: int = 3, cutoff: float = 0.3) -> List[str]:
+    """Names of the roles closest to `name` by trigram similarity."""
+    _ensure(guild)
+    query = _grams(name.casefold())
+    trigrams = _trigrams[guild.id]
+    shared: Dict[int, int] = {}
+    for gram in query:
+        for role_id in trigrams.get(gram, ()):
+            shared[role_id] = shared.get(role_id, 0) + 1
+    names = _names[guild.id]
+    scored = []
+    for role_id, count in shared.items():
+        score = count / (len(query) + len(_grams(names[role_id])) - count)
+        if score >= cutoff:
+            scored.append((score, role_id))
+    scored.sort(reverse=True)
+    suggestions: List[str] = []
+    for _, role_id in scored:
+        role = guild.get_role(role_id)
+        if role is not None and role.name not in suggestions:
+            suggestions.append(role.name)
+        if len(suggestions) >= limit:
+            break
+    return suggestions
@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import json
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.storage import ensure_schema
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    due REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timers_due ON timers (due);
+CREATE UNIQUE INDEX IF NOT EXISTS timers_key ON timers (key);
+"""
+
+# A failing action is retried after 30s, 60s, 120s... and dropped after the last attempt.
+TIMER_RETRY_DELAY = 30
+TIMER_MAX_ATTEMPTS = 5
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class TimerScheduler:
+    """Single-task scheduler for delayed actions, persisted in SQLite.
+
+    Pending actions live in a min-heap keyed by due time; the run loop sleeps
+    until the earliest deadline (or until something earlier is scheduled).
+    Rows are only deleted once their action has completed, so anything
+    pending or still running at shutdown is replayed by start() on the next
+    run; actions that raise are retried with backoff.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._entries: Dict[int, Tuple[str, int, Dict[str, Any]]] = {}
+        self._cancelled: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._dispatching: Set[asyncio.Task] = set()
+        self._attempts: Dict[int, int] = {}
+        self._conn = None
+
+    def register(self, action: str, handler: Handler) -> None:
+        """Register the coroutine run when an `action` timer expires."""
+        self._handlers[action] = handler
+
+    def start(self, guild_filter: Optional[Callable[[int], bool]] = None) -> None:
+        """Load pending timers from disk and start the run loop. Idempotent."""
+        if self._task is not None:
+            return
+        self._conn = ensure_schema(SCHEMA)
+        for row in self._conn.execute("SELECT id, action, due, guild_id, payload FROM timers"):
+            if guild_filter is not None and not guild_filter(row["guild_id"]):
+                continue
+            self._push(row["id"], row["action"], row["due"], row["guild_id"], json.loads(row["payload"]))
+        self._task = asyncio.create_task(self._run())
+
+    def _push(self, timer_id: int, action: str, due: float, guild_id: int, payload: Dict[str, Any]) -> None:
+        self._entries[timer_id] = (action, guild_id, payload)
+        heapq.heappush(self._heap, (due, timer_id))
+        if self._heap[0][1] == timer_id:
+            self._wakeup.set()
+
+    def schedule(self, action: str, delay: float, guild_id: int, payload: Dict[str, Any],
+                 key: Optional[str] = None) -> int:
+        """Run `action` with `payload` after `delay` seconds.
+
+        Scheduling with the `key` of a pending timer replaces that timer.
+        """
+        if self._conn is None:
+            self._conn = ensure_schema(SCHEMA)
+        if key is not None:
+            self.cancel_key(key)
+        due = time.time() + delay
+        cursor = self._conn.execute(
+            "INSERT INTO timers (action, due, guild_id, key, payload) VALUES (?, ?, ?, ?, ?)",
+            (action, due, guild_id, key, json.dumps(payload)),
+        )
+        self._push(cursor.lastrowid, action, due, guild_id, payload)
+        return cursor.lastrowid
+
+    def cancel(self, timer_id: int) -> bool:
+        if self._entries.pop(timer_id, None) is None:
+            return False
+        self._cancelled.add(timer_id)
+        self._attempts.pop(timer_id, None)
+        self._conn.execute("DELETE FROM timers WHERE id = ?", (timer_id,))
+        return True
+
+    def cancel_key(self, key: str) -> bool:
+        if self._conn is None:
+            self._conn = ensure_schema(SCHEMA)
+        row = self._conn.execute("SELECT id FROM timers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        if not self.cancel(row["id"]):
+            self._conn.execute("DELETE FROM timers WHERE id = ?", (row["id"],))
+        return True
+
+    async def stop(self) -> None:
+        """Stop the run loop and interrupt running actions; their rows are replayed by start()."""
+        tasks = list(self._dispatching)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def pending(self, guild_id: Optional[int] = None) -> int:
+        return sum(1 for _, g, _ in self._entries.values() if guild_id in (None, g))
+
+    async def _run(self) -> None:
+        while True:
+            while self._heap and self._heap[0][1] in self._cancelled:
+                self._cancelled.discard(heapq.heappop(self._heap)[1])
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, timer_id = heapq.heappop(self._heap)
+            entry = self._entries.pop(timer_id, None)
+            if entry is None:
+                self._cancelled.discard(timer_id)
+                continue
+            task = asyncio.create_task(self._dispatch(timer_id, *entry))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, timer_id: int, action: str, guild_id: int, payload: Dict[str, Any]) -> None:
+        handler = self._handlers.get(action)
+        if handler is None:
+            print(f"No handler registered for timer action '{action}'")
+        else:
+            try:
+                await handler(payload)
+            except Exception:
+                attempt = self._attempts.pop(timer_id, 0) + 1
+                print(f"Timer action '{action}' for guild {guild_id} failed (attempt {attempt}):")
+                traceback.print_exc()
+                if attempt < TIMER_MAX_ATTEMPTS:
+                    due = time.time() + TIMER_RETRY_DELAY * 2 ** (attempt - 1)
+                    # The row is gone if the timer was cancelled or replaced meanwhile
+                    if self._conn.execute("UPDATE timers SET due = ? WHERE id = ?", (due, timer_id)).rowcount:
+                        self._attempts[timer_id] = attempt
+                        self._push(timer_id, action, due, guild_id, payload)
+                    return
+        self._attempts.pop(timer_id, None)
+        self._conn.execute("DELETE FROM timers WHERE id = ?", (timer_id,))
+
+
+scheduler = TimerScheduler()
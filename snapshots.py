@@ -0,0 +1,335 @@
+"""Role layout snapshots and diff-based restore.
+
+Usage: python snapshots.py save GUILD_ID snapshot.json.gz
+       python snapshots.py show snapshot.json.gz
+       python snapshots.py restore snapshot.json.gz --guild GUILD_ID [--apply]
+
+A snapshot holds every role's name, color, permission bitfield, hoist,
+mentionable flag, position and members, as gzipped JSON. Restoring recreates
+missing roles, reverts changed ones, restores their order and gives members
+back the roles they had. It never deletes roles or takes roles away.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from utils import role_cache
+from utils.fanout import fan_out, FanoutResult, SKIPPED
+from utils.member_cache import COMPACT
+from utils.ratelimit import BucketLimiter
+from utils.role_positions import plan_reorder
+
+SNAPSHOT_VERSION = 1
+# Where !snapshotroles keeps a copy of every snapshot it takes.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+
+class SnapshotError(Exception):
+    """Raised for snapshot files that cannot be read."""
+
+
+@dataclass
+class RoleSnapshot:
+    role_id: int
+    name: str
+    color: int
+    permissions: int
+    hoist: bool
+    mentionable: bool
+    position: int
+    members: List[int] = field(default_factory=list)
+
+    def differs_from(self, role: discord.Role) -> bool:
+        return (role.name != self.name
+                or role.color.value != self.color
+                or role.permissions.value != self.permissions
+                or role.hoist != self.hoist
+                or role.mentionable != self.mentionable)
+
+
+@dataclass
+class Snapshot:
+    guild_id: int
+    taken_at: float
+    roles: List[RoleSnapshot]
+
+    def summary(self) -> str:
+        members = sum(len(role.members) for role in self.roles)
+        taken = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.taken_at))
+        return f"{len(self.roles)} roles and {members} role assignments from {taken}"
+
+
+def take_snapshot(guild: discord.Guild) -> Snapshot:
+    """Snapshot the guild's roles, with members from role_cache.
+
+    Call role_cache.ensure_member_index first. @everyone and roles managed
+    by integrations are left out since they cannot be recreated.
+    """
+    roles = []
+    for role in guild.roles[1:]:  # Skip @everyone role
+        if role.managed:
+            continue
+        roles.append(RoleSnapshot(role.id, role.name, role.color.value, role.permissions.value, role.hoist,
+                                  role.mentionable, role.position, sorted(role_cache.role_members(guild, role.id))))
+    return Snapshot(guild.id, time.time(), roles)
+
+
+def dump_snapshot(snapshot: Snapshot) -> bytes:
+    """Serialize a snapshot: one array per role, member ids delta-encoded."""
+    roles = []
+    for role in snapshot.roles:
+        deltas, previous = [], 0
+        for member_id in role.members:
+            deltas.append(member_id - previous)
+            previous = member_id
+        roles.append([role.role_id, role.name, role.color, role.permissions, int(role.hoist),
+                      int(role.mentionable), role.position, deltas])
+    data = {"version": SNAPSHOT_VERSION, "guild_id": snapshot.guild_id, "taken_at": snapshot.taken_at, "roles": roles}
+    return gzip.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def load_snapshot(blob: bytes) -> Snapshot:
+    try:
+        data = json.loads(gzip.decompress(blob))
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Not a role snapshot file: {e}")
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {data.get('version') if isinstance(data, dict) else None}.")
+    roles = []
+    try:
+        for role_id, name, color, permissions, hoist, mentionable, position, deltas in data["roles"]:
+            members, previous = [], 0
+            for delta in deltas:
+                previous += delta
+                members.append(previous)
+            roles.append(RoleSnapshot(role_id, name, color, permissions, bool(hoist), bool(mentionable),
+                                      position, members))
+        return Snapshot(data["guild_id"], data["taken_at"], roles)
+    except (KeyError, TypeError, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {e}")
+
+
+@dataclass
+class RestorePlan:
+    creates: List[RoleSnapshot] = field(default_factory=list)
+    edits: List[Any] = field(default_factory=list)  # (discord.Role, RoleSnapshot)
+    matched: Dict[int, discord.Role] = field(default_factory=dict)  # snapshot role id -> current role
+    member_adds: Dict[int, List[int]] = field(default_factory=dict)  # member id -> snapshot role ids
+    unchanged: int = 0
+    order: List[RoleSnapshot] = field(default_factory=list)
+
+    def summary(self) -> str:
+        assignments = sum(len(ids) for ids in self.member_adds.values())
+        return (f"{len(self.creates)} roles to create, {len(self.edits)} to revert, {self.unchanged} unchanged, "
+                f"{assignments} role assignments to restore for {len(self.member_adds)} members")
+
+
+def plan_restore(guild: discord.Guild, snapshot: Snapshot) -> RestorePlan:
+    """Diff a snapshot against the guild.
+
+    Snapshot roles are matched to current roles by id, then by exact name.
+    Members are only considered if they are still in the member index.
+    """
+    plan = RestorePlan(order=sorted(snapshot.roles, key=lambda role: role.position))
+    by_name: Dict[str, discord.Role] = {}
+    for role in guild.roles[1:]:
+        by_name.setdefault(role.name, role)
+    used = set()
+    for entry in snapshot.roles:
+        role = guild.get_role(entry.role_id)
+        if role is None or role.id in used:
+            role = by_name.get(entry.name)
+        if role is None or role.id in used:
+            plan.creates.append(entry)
+            continue
+        used.add(role.id)
+        plan.matched[entry.role_id] = role
+        if entry.differs_from(role):
+            plan.edits.append((role, entry))
+        else:
+            plan.unchanged += 1
+
+    for entry in snapshot.roles:
+        role = plan.matched.get(entry.role_id)
+        for member_id in entry.members:
+            role_ids = role_cache.cached_role_ids(guild, member_id)
+            if role_ids is None or (role is not None and role.id in role_ids):
+                continue
+            plan.member_adds.setdefault(member_id, []).append(entry.role_id)
+    return plan
+
+
+async def apply_restore(
+    guild: discord.Guild,
+    plan: RestorePlan,
+    http,
+    role_limiter: Optional[BucketLimiter] = None,
+    member_limiter: Optional[BucketLimiter] = None,
+    on_progress: Optional[Callable[[str, FanoutResult], Awaitable[None]]] = None,
+    reason: str = "Role snapshot restore",
+) -> Tuple[FanoutResult, FanoutResult]:
+    """Restore roles, then their order in one request, then members.
+
+    Each member gets all their missing roles back in a single member edit
+    when their current roles are cached, or one add-role call per role
+    otherwise. `http` is the client's HTTP client (bot.http).
+    """
+    ceiling = guild.me.top_role
+    matched = dict(plan.matched)
+
+    async def apply_role(item):
+        role, entry = item
+        fields = dict(name=entry.name, color=discord.Color(entry.color),
+                      permissions=discord.Permissions(entry.permissions),
+                      hoist=entry.hoist, mentionable=entry.mentionable, reason=reason)
+        if role is None:
+            matched[entry.role_id] = await guild.create_role(**fields)
+        else:
+            await role.edit(**fields)
+
+    async def role_progress(result):
+        if on_progress is not None:
+            await on_progress("roles", result)
+
+    roles_result = await fan_out(
+        [(None, entry) for entry in plan.creates] + list(plan.edits),
+        apply_role,
+        concurrency=4,
+        limiter=role_limiter,
+        bucket_key=lambda item: guild.id,
+        can_act=lambda item: item[0] is None or item[0] < ceiling,
+        on_progress=role_progress,
+    )
+
+    # Created roles only reach guild.roles once their gateway event arrives.
+    roles = sorted({role.id: role for role in guild.roles + list(matched.values())}.values())
+    managed = [matched[entry.role_id] for entry in plan.order if entry.role_id in matched]
+    changes = {role: position for role, position in plan_reorder(roles, managed).items()
+               if role < ceiling and position < ceiling.position}
+    if changes:
+        await guild.edit_role_positions(changes, reason=reason)
+
+    async def restore_member(item):
+        member_id, entry_ids = item
+        role_ids = [matched[entry_id].id for entry_id in entry_ids
+                    if entry_id in matched and matched[entry_id] < ceiling]
+        if not role_ids:
+            return SKIPPED
+        # In lite mode the cached roles may be stale, and a full-list edit
+        # would take away roles granted since, so only add.
+        current = None if COMPACT else role_cache.cached_role_ids(guild, member_id)
+        try:
+            if current is not None:
+                roles = sorted((set(current) | set(role_ids)) - {guild.id})
+                await http.edit_member(guild.id, member_id, roles=roles, reason=reason)
+            else:
+                for role_id in role_ids:
+                    await http.add_role(guild.id, member_id, role_id, reason=reason)
+        except discord.NotFound:
+            return SKIPPED
+        role_cache.apply_role_delta(guild.id, member_id, added=role_ids)
+
+    async def member_progress(result):
+        if on_progress is not None:
+            await on_progress("members", result)
+
+    members_result = await fan_out(
+        list(plan.member_adds.items()),
+        restore_member,
+        limiter=member_limiter,
+        bucket_key=lambda item: guild.id,
+        on_progress=member_progress,
+    )
+    return roles_result, members_result
+
+
+def save_snapshot_file(snapshot: Snapshot, directory: str = SNAPSHOT_DIR) -> str:
+    """Write a snapshot under `directory` and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{snapshot.guild_id}-{int(snapshot.taken_at)}.json.gz")
+    with open(path, "wb") as f:
+        f.write(dump_snapshot(snapshot))
+    return path
+
+
+def latest_snapshot_file(guild_id: int, directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of the newest snapshot saved for a guild, if any."""
+    if not os.path.isdir(directory):
+        return None
+    prefix = f"{guild_id}-"
+    names = [name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".json.gz")]
+    if not names:
+        return None
+    return os.path.join(directory, max(names, key=lambda name: int(name[len(prefix):-len(".json.gz")])))
+
+
+async def _run_cli(args) -> None:
+    if args.command == "show":
+        with open(args.file, "rb") as f:
+            snapshot = load_snapshot(f.read())
+        print(f"Guild {snapshot.guild_id}: {snapshot.summary()}")
+        for role in sorted(snapshot.roles, key=lambda role: -role.position):
+            print(f"{role.position:>4} {role.name}: color=#{role.color:06x} permissions={role.permissions} "
+                  f"hoist={role.hoist} mentionable={role.mentionable} members={len(role.members)}")
+        return
+
+    token = os.getenv("DISCORD_BOT_TOKEN")
+    if not token:
+        raise SystemExit("Set DISCORD_BOT_TOKEN to read from or restore to a guild.")
+    client = discord.Client(intents=discord.Intents(guilds=True, members=True))
+    guild_id = args.guild_id if args.command == "save" else args.guild
+
+    @client.event
+    async def on_ready():
+        try:
+            guild = client.get_guild(guild_id)
+            if guild is None:
+                print(f"Guild {guild_id} not found.")
+                return
+            if not guild.chunked:
+                await guild.chunk()
+            role_cache.build_guild_index(guild)
+            if args.command == "save":
+                snapshot = take_snapshot(guild)
+                with open(args.file, "wb") as f:
+                    f.write(dump_snapshot(snapshot))
+                print(f"Saved {snapshot.summary()} to {args.file}")
+                return
+            with open(args.file, "rb") as f:
+                plan = plan_restore(guild, load_snapshot(f.read()))
+            print(plan.summary())
+            if args.apply:
+                roles_result, members_result = await apply_restore(guild, plan, client.http,
+                                                                   reason="Role snapshot restore (CLI)")
+                print(f"Roles: {roles_result.summary()}")
+                print(f"Members: {members_result.summary()}")
+        finally:
+            await client.close()
+
+    await client.start(token)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Save, inspect and restore role layout snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    save = commands.add_parser("save", help="snapshot a guild's roles to a file")
+    save.add_argument("guild_id", type=int)
+    save.add_argument("file")
+    show = commands.add_parser("show", help="print a snapshot file")
+    show.add_argument("file")
+    restore = commands.add_parser("restore", help="diff a snapshot against a guild")
+    restore.add_argument("file")
+    restore.add_argument("--guild", type=int, required=True, help="guild id to restore to")
+    restore.add_argument("--apply", action="store_true", help="apply the diff instead of only printing it")
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import sqlite3
+from typing import Optional
+
+# Local state shared by the scheduler and other persistent stores.
+DB_PATH = os.getenv("BOT_DB_PATH", "bot_state.db")
+
+_connection: Optional[sqlite3.Connection] = None
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return the process-wide SQLite connection, opening it on first use."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA busy_timeout=5000")
+    return _connection
+
+
+def ensure_schema(schema: str) -> sqlite3.Connection:
+    """Run a module's CREATE TABLE IF NOT EXISTS script and return the connection."""
+    conn = get_connection()
+    conn.executescript(schema)
+    return conn
@@ -0,0 +1,98 @@
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import discord
+
+from utils.role_helpers import role_templates, get_template_info
+from utils.storage import ensure_schema
+
+# How many guilds' custom templates are kept in memory.
+TEMPLATE_CACHE_GUILDS = int(os.getenv("TEMPLATE_CACHE_GUILDS", "256"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_templates (
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    color INTEGER NOT NULL,
+    permissions INTEGER NOT NULL,
+    hoist INTEGER NOT NULL,
+    mentionable INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (guild_id, name)
+);
+"""
+
+
+class TemplateStore:
+    """Per-guild custom role templates stored in SQLite.
+
+    Templates have the same shape as role_templates (permissions already a
+    bitfield). A guild's templates are loaded on first use into an LRU cache,
+    together with the rendered !listtemplates text, and both are dropped
+    whenever that guild's templates change.
+    """
+
+    def __init__(self, max_guilds: int = TEMPLATE_CACHE_GUILDS):
+        self.max_guilds = max_guilds
+        self._templates: "OrderedDict[int, Dict[str, dict]]" = OrderedDict()
+        self._info: Dict[int, str] = {}
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = ensure_schema(SCHEMA)
+        return self._conn
+
+    def get_templates(self, guild_id: int) -> Dict[str, dict]:
+        """Built-in templates plus the guild's own, by name."""
+        templates = self._templates.get(guild_id)
+        if templates is not None:
+            self._templates.move_to_end(guild_id)
+            return templates
+        templates = dict(role_templates)
+        for row in self._db().execute("SELECT * FROM guild_templates WHERE guild_id = ? ORDER BY name", (guild_id,)):
+            templates[row["name"]] = {
+                "color": discord.Color(row["color"]),
+                "permissions": row["permissions"],
+                "hoist": bool(row["hoist"]),
+                "mentionable": bool(row["mentionable"]),
+                "description": row["description"],
+                "custom": True,
+            }
+        self._templates[guild_id] = templates
+        if len(self._templates) > self.max_guilds:
+            evicted, _ = self._templates.popitem(last=False)
+            self._info.pop(evicted, None)
+        return templates
+
+    def get_template(self, guild_id: int, name: str) -> Optional[dict]:
+        return self.get_templates(guild_id).get(name.lower())
+
+    def template_info(self, guild_id: int) -> str:
+        """The rendered template listing for a guild, cached until it changes."""
+        info = self._info.get(guild_id)
+        if info is None:
+            info = self._info[guild_id] = get_template_info(self.get_templates(guild_id))
+        return info
+
+    def save_template(self, guild_id: int, name: str, color: discord.Color, permissions: int,
+                      hoist: bool, mentionable: bool, description: str) -> None:
+        self._db().execute(
+            "INSERT OR REPLACE INTO guild_templates VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (guild_id, name.lower(), color.value, permissions, int(hoist), int(mentionable), description),
+        )
+        self.invalidate(guild_id)
+
+    def delete_template(self, guild_id: int, name: str) -> bool:
+        cursor = self._db().execute("DELETE FROM guild_templates WHERE guild_id = ? AND name = ?",
+                                    (guild_id, name.lower()))
+        self.invalidate(guild_id)
+        return cursor.rowcount > 0
+
+    def invalidate(self, guild_id: int) -> None:
+        self._templates.pop(guild_id, None)
+        self._info.pop(guild_id, None)
+
+
+template_store = TemplateStore()
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from utils.bulk_roles import resolve_targets
+from utils.moderation import split_reason
+
+BOT_ID = 900000000000000001
+ALICE_ID = 100000000000000001
+BOB_ID = 100000000000000002
+
+
+def make_ctx(content: str):
+    # raw_mentions covers the whole message, prefix and reason included
+    raw_mentions = [int(token.strip("<@!>\"")) for token in content.split() if token.startswith("<@")]
+    return SimpleNamespace(
+        guild=SimpleNamespace(id=1),
+        me=SimpleNamespace(id=BOT_ID),
+        message=SimpleNamespace(content=content, raw_mentions=raw_mentions),
+    )
+
+
+def test_mention_prefix_is_not_a_target():
+    spec = f"<@{ALICE_ID}> <@!{BOB_ID}>"
+    for prefix in (f"<@{BOT_ID}> ", f"<@!{BOT_ID}> "):
+        ctx = make_ctx(f"{prefix}bulkassignrole Role {spec}")
+        member_ids, dry_run, errors = resolve_targets(ctx, spec)
+        assert member_ids == {ALICE_ID, BOB_ID}
+        assert not dry_run and not errors
+
+
+def test_bot_named_as_target_is_kept():
+    spec = f"<@{ALICE_ID}> <@{BOT_ID}>"
+    ctx = make_ctx(f"<@{BOT_ID}> bulkassignrole Role {spec}")
+    member_ids, _, _ = resolve_targets(ctx, spec)
+    assert member_ids == {ALICE_ID, BOT_ID}
+
+
+def test_mentions_in_the_reason_are_not_targets():
+    targets = f'<@{ALICE_ID}> reason:"ping <@{BOB_ID}> if this recurs"'
+    ctx = make_ctx(f"!godsmitemany {targets}")
+    spec, reason = split_reason(targets)
+    member_ids, _, errors = resolve_targets(ctx, spec)
+    assert member_ids == {ALICE_ID}
+    assert not errors
+
+
+def test_ids_and_dry_run():
+    member_ids, dry_run, errors = resolve_targets(make_ctx(""), f"{ALICE_ID} dry-run")
+    assert member_ids == {ALICE_ID} and dry_run and not errors
+
+
+def test_unknown_tokens_are_reported():
+    _, _, errors = resolve_targets(make_ctx(""), "@everyone")
+    assert errors == ["Unknown target '@everyone'"]
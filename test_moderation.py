@@ -0,0 +1,17 @@
+from utils.moderation import split_reason
+
+
+def test_split_reason_quoted_and_bare():
+    assert split_reason('<@1> <@2> reason:"Raid from another server"') == ("<@1> <@2>", "Raid from another server")
+    assert split_reason("joined:10m reason:spam dry-run") == ("joined:10m dry-run", "spam")
+
+
+def test_split_reason_only_at_a_word_start():
+    assert split_reason("<@1> <@2>") == ("<@1> <@2>", None)
+    assert split_reason("match:treason:x") == ("match:treason:x", None)
+
+
+def test_split_reason_keeps_mentions_inside_the_reason_out_of_the_spec():
+    spec, reason = split_reason('<@1> reason:"ping <@2> if this recurs"')
+    assert spec == "<@1>"
+    assert reason == "ping <@2> if this recurs"
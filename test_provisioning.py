@@ -0,0 +1,19 @@
+from utils.provisioning import plan_order
+
+
+def test_manifest_already_in_order_sends_nothing(make_guild):
+    guild = make_guild(("A", 2), ("B", 5), ("C", 7), ("D", 9))
+    # Manifests list roles top first
+    assert plan_order(guild.roles, ["D", "C", "B", "A"]) == {}
+
+
+def test_reorder_uses_the_positions_the_manifest_roles_hold(make_guild):
+    guild = make_guild(("A", 2), ("Other", 4), ("B", 5), ("C", 7))
+    changes = plan_order(guild.roles, ["A", "B", "C"])
+    assert changes == {guild.role("C"): 2, guild.role("A"): 7}
+    assert guild.role("Other") not in changes
+
+
+def test_roles_missing_from_the_guild_are_ignored(make_guild):
+    guild = make_guild(("A", 1), ("B", 2))
+    assert plan_order(guild.roles, ["A", "Not Created Yet", "B"]) == {guild.role("A"): 2, guild.role("B"): 1}
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from utils.role_helpers import UnknownPermissionError, has_role_permission, parse_permissions
+
+
+def test_parse_permissions_names_aliases_and_groups():
+    assert parse_permissions("kick,ban") == discord.Permissions(kick_members=True, ban_members=True).value
+    assert parse_permissions("KICK_MEMBERS") == discord.Permissions(kick_members=True).value
+    moderation = discord.Permissions(parse_permissions("moderation"))
+    assert moderation.ban_members and moderation.manage_messages and not moderation.administrator
+
+
+def test_parse_permissions_applies_negations_left_to_right():
+    everything_but_admin = discord.Permissions(parse_permissions("all,-admin"))
+    assert everything_but_admin.manage_roles and not everything_but_admin.administrator
+    assert not discord.Permissions(parse_permissions("moderation,-ban")).ban_members
+    assert parse_permissions("-ban,ban") == discord.Permissions(ban_members=True).value
+    assert parse_permissions("") == 0
+
+
+def test_parse_permissions_reports_every_unknown_name():
+    with pytest.raises(UnknownPermissionError) as excinfo:
+        parse_permissions("kick,fly,teleport")
+    assert excinfo.value.names == ["fly", "teleport"]
+
+
+def check(guild, member, role_name, or_above=False):
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    ctx = SimpleNamespace(guild=guild, author=member, send=send)
+    allowed = asyncio.run(has_role_permission(role_name, or_above=or_above).predicate(ctx))
+    return allowed, sent
+
+
+def test_role_gate_exact_and_or_above(make_guild):
+    guild = make_guild(("Member", 1), ("King", 5), ("God", 8))
+    king = guild.member(1, "King")
+    god = guild.member(2, "God")
+    member = guild.member(3, "Member")
+
+    assert check(guild, king, "King")[0]
+    assert not check(guild, god, "King")[0]
+    assert check(guild, god, "King", or_above=True)[0]
+    assert not check(guild, member, "King", or_above=True)[0]
+    assert not check(guild, king, "God", or_above=True)[0]
+
+
+def test_role_gate_reports_a_missing_role(make_guild):
+    guild = make_guild(("Member", 1))
+    allowed, sent = check(guild, guild.member(1, "Member"), "King", or_above=True)
+    assert not allowed
+    assert sent == ["The King role doesn't exist in this server!"]
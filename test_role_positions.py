@@ -0,0 +1,61 @@
+import pytest
+
+from utils.role_positions import PositionError, parse_move_direction, plan_move, plan_reorder
+
+
+@pytest.fixture
+def guild(make_guild):
+    # Positions have gaps, as they do in real guilds
+    return make_guild(("A", 2), ("B", 5), ("C", 7), ("D", 9), ("Bot", 12))
+
+
+def test_move_up_swaps_positions_of_the_slots_involved(guild):
+    changes = plan_move(guild.roles, [guild.role("A")], "up", amount=2)
+    assert changes == {guild.role("B"): 2, guild.role("C"): 5, guild.role("A"): 7}
+
+
+def test_move_over_reference(guild):
+    changes = plan_move(guild.roles, [guild.role("A")], "over", reference=guild.role("B"))
+    assert changes == {guild.role("B"): 2, guild.role("A"): 5}
+
+
+def test_move_to_top_stops_below_the_ceiling(guild):
+    changes = plan_move(guild.roles, [guild.role("B")], "top", ceiling=guild.role("Bot"))
+    assert changes == {guild.role("C"): 5, guild.role("D"): 7, guild.role("B"): 9}
+
+
+def test_move_keeps_several_roles_together_in_order(guild):
+    changes = plan_move(guild.roles, [guild.role("C"), guild.role("A")], "bottom")
+    assert changes == {guild.role("C"): 5, guild.role("B"): 7}
+
+
+def test_move_already_in_place_sends_nothing(guild):
+    assert plan_move(guild.roles, [guild.role("A")], "bottom") == {}
+
+
+def test_move_refuses_everyone_and_roles_above_the_ceiling(guild):
+    with pytest.raises(PositionError):
+        plan_move(guild.roles, [guild.roles[0]], "up", amount=1)
+    with pytest.raises(PositionError):
+        plan_move(guild.roles, [guild.role("D")], "up", amount=1, ceiling=guild.role("C"))
+    with pytest.raises(PositionError):
+        plan_move(guild.roles, [guild.role("A")], "over", reference=guild.role("A"))
+
+
+def test_reorder_in_place_sends_nothing(guild):
+    roles = guild.roles
+    assert plan_reorder(roles, [guild.role("A"), guild.role("B"), guild.role("C"), guild.role("D")]) == {}
+
+
+def test_reorder_reuses_the_positions_the_roles_hold(guild):
+    changes = plan_reorder(guild.roles, [guild.role("C"), guild.role("A")])
+    # B stays where it is, between the two slots being swapped
+    assert changes == {guild.role("C"): 2, guild.role("A"): 7}
+
+
+def test_parse_move_direction():
+    assert parse_move_direction("move up 3") == ("up", 3, None)
+    assert parse_move_direction("down") == ("down", 1, None)
+    assert parse_move_direction("move over Senior Mods") == ("over", None, "Senior Mods")
+    assert parse_move_direction("moveto top") == ("top", None, None)
+    assert parse_move_direction("sideways") is None
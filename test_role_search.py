@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from utils import role_search
+
+
+@pytest.fixture
+def guild(make_guild):
+    guild = make_guild(("Moderator", 1), ("Mod Team", 2), ("Admin", 3), ("mod-eu", 4), ("mod-us", 5),
+                       ("Event Host", 6))
+    yield guild
+    role_search.drop_guild(guild.id)
+
+
+def names(roles):
+    return [role.name for role in roles]
+
+
+def test_select_substring_ignores_case(guild):
+    assert names(role_search.select(guild, "MOD")) == ["Moderator", "Mod Team", "mod-eu", "mod-us"]
+    assert names(role_search.select(guild, "x")) == []
+
+
+def test_select_glob_matches_the_whole_name(guild):
+    assert names(role_search.select(guild, "mod-*")) == ["mod-eu", "mod-us"]
+    assert names(role_search.select(guild, "mod-?s")) == ["mod-us"]
+    assert names(role_search.select(guild, "*host")) == ["Event Host"]
+
+
+def test_select_regex(guild):
+    assert names(role_search.select(guild, "re:^(admin|event)")) == ["Admin", "Event Host"]
+    with pytest.raises(re.error):
+        role_search.select(guild, "re:(")
+
+
+def test_select_follows_renames_and_deletes(guild):
+    role = guild.role("Admin")
+    before = type(role)(guild, role.id, role.name, role.position)
+    role.name = "Moderation Lead"
+    role_search.update_role(before, role)
+    assert "Moderation Lead" in names(role_search.select(guild, "moderat"))
+    assert names(role_search.select(guild, "admin")) == []
+
+    role_search.remove_role(role)
+    assert "Moderation Lead" not in names(role_search.select(guild, "moderat"))
+
+
+def test_suggest_ranks_close_names_first(guild):
+    assert role_search.suggest(guild, "Moderater")[0] == "Moderator"
+    assert role_search.suggest(guild, "evnt host") == ["Event Host"]
+    assert role_search.suggest(guild, "zzzz") == []
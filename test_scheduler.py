@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from utils import scheduler as scheduler_module
+from utils.scheduler import TimerScheduler
+from utils.storage import get_connection
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+def rows():
+    return get_connection().execute("SELECT COUNT(*) FROM timers").fetchone()[0]
+
+
+async def settle(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_overdue_timers_are_replayed_after_a_restart():
+    async def run():
+        TimerScheduler().schedule("unmute", 0, 1, {"member_id": 7})  # Never started: the bot stopped
+
+        calls = []
+
+        async def unmute(payload):
+            calls.append(payload)
+
+        restarted = TimerScheduler()
+        restarted.register("unmute", unmute)
+        restarted.start()
+        await settle(lambda: calls and not rows())
+        await restarted.stop()
+        return calls
+
+    assert asyncio.run(run()) == [{"member_id": 7}]
+
+
+def test_failed_actions_are_retried_and_kept_until_they_succeed(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "TIMER_RETRY_DELAY", 0.01)
+
+    async def run():
+        attempts = []
+        rows_after_failure = []
+
+        async def flaky(payload):
+            attempts.append(payload)
+            if len(attempts) < 3:
+                rows_after_failure.append(rows())
+                raise RuntimeError("Discord is down")
+
+        scheduler = TimerScheduler()
+        scheduler.register("flaky", flaky)
+        scheduler.start()
+        scheduler.schedule("flaky", 0, 1, {})
+        await settle(lambda: len(attempts) == 3 and not rows())
+        await scheduler.stop()
+        return attempts, rows_after_failure
+
+    attempts, rows_after_failure = asyncio.run(run())
+    assert len(attempts) == 3
+    assert rows_after_failure == [1, 1]
+
+
+def test_actions_interrupted_by_stop_run_again_on_start():
+    async def run():
+        started = []
+
+        async def slow(payload):
+            started.append(payload)
+            await asyncio.sleep(60)
+
+        scheduler = TimerScheduler()
+        scheduler.register("slow", slow)
+        scheduler.start()
+        scheduler.schedule("slow", 0, 1, {"n": 1})
+        await settle(lambda: started)
+        await scheduler.stop()
+        kept = rows()
+
+        resumed = []
+
+        async def fast(payload):
+            resumed.append(payload)
+
+        restarted = TimerScheduler()
+        restarted.register("slow", fast)
+        restarted.start()
+        await settle(lambda: resumed and not rows())
+        await restarted.stop()
+        return kept, resumed
+
+    assert asyncio.run(run()) == (1, [{"n": 1}])
+
+
+def test_scheduling_with_a_key_replaces_the_pending_timer():
+    scheduler = TimerScheduler()
+    assert not scheduler.cancel_key("unmute:1:2")  # Works before start()
+    scheduler.schedule("unmute", 60, 1, {"n": 1}, key="unmute:1:2")
+    scheduler.schedule("unmute", 60, 1, {"n": 2}, key="unmute:1:2")
+    assert rows() == 1 and scheduler.pending(1) == 1
+    assert scheduler.cancel_key("unmute:1:2")
+    assert rows() == 0 and scheduler.pending() == 0
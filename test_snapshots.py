@@ -0,0 +1,33 @@
+import gzip
+import json
+
+import pytest
+
+from utils.snapshots import RoleSnapshot, Snapshot, SnapshotError, dump_snapshot, load_snapshot
+
+
+def make_snapshot():
+    return Snapshot(42, 1700000000.5, [
+        RoleSnapshot(1001, "Moderator", 0x3498DB, 8198, True, False, 3, [10, 11, 250, 9000000000000000001]),
+        RoleSnapshot(1002, "Empty", 0, 0, False, True, 1, []),
+    ])
+
+
+def test_dump_load_round_trip():
+    snapshot = make_snapshot()
+    assert load_snapshot(dump_snapshot(snapshot)) == snapshot
+
+
+def test_member_ids_are_delta_encoded():
+    data = json.loads(gzip.decompress(dump_snapshot(make_snapshot())))
+    assert data["roles"][0][-1] == [10, 1, 239, 9000000000000000001 - 250]
+
+
+def test_load_rejects_other_files():
+    with pytest.raises(SnapshotError):
+        load_snapshot(b"not gzip at all")
+    with pytest.raises(SnapshotError):
+        load_snapshot(gzip.compress(json.dumps({"version": 99, "roles": []}).encode()))
+    with pytest.raises(SnapshotError):
+        load_snapshot(gzip.compress(json.dumps({"version": 1, "guild_id": 1, "taken_at": 0,
+                                                "roles": [[1, "short"]]}).encode()))
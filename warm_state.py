@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from array import array
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from utils import metrics, role_cache
+from utils.member_cache import COMPACT
+
+# WARM_START=1 saves every guild's member-role index to disk periodically and
+# loads it at startup, so commands can answer before the member lists have
+# been chunked (or, in lite mode, fetched) again.
+WARM_START = os.getenv("WARM_START", "0") == "1"
+WARM_STATE_DIR = os.getenv("WARM_STATE_DIR", "warm_state")
+WARM_STATE_INTERVAL = float(os.getenv("WARM_STATE_INTERVAL", "300"))
+
+FORMAT_VERSION = 1
+
+metrics.warm_guilds.fn = lambda: len(role_cache.warm_guilds())
+metrics.warm_state_age.fn = lambda: max((role_cache.warm_age(g) or 0 for g in role_cache.warm_guilds()), default=0)
+
+
+def bot_options() -> Dict[str, object]:
+    """Extra commands.Bot keyword arguments: chunking moves to the background."""
+    return {"chunk_guilds_at_startup": False} if WARM_START else {}
+
+
+def _path(guild_id: int) -> str:
+    return os.path.join(WARM_STATE_DIR, f"{guild_id}.state")
+
+
+def encode(guild_id: int, members: List[Tuple[int, Collection[int]]], saved_at: float) -> bytes:
+    """A JSON header line, then zlib-compressed uint64s: member id, role count, role ids..."""
+    flat = array("Q")
+    for member_id, role_ids in members:
+        flat.append(member_id)
+        flat.append(len(role_ids))
+        flat.extend(role_ids)
+    header = {"version": FORMAT_VERSION, "guild_id": guild_id, "saved_at": saved_at, "members": len(members)}
+    return json.dumps(header).encode() + b"\n" + zlib.compress(flat.tobytes())
+
+
+def decode(blob: bytes) -> Tuple[int, float, List[Tuple[int, array]]]:
+    """Returns (guild id, saved at, members). Raises ValueError for unreadable files."""
+    header_line, _, body = blob.partition(b"\n")
+    header = json.loads(header_line)
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported version {header.get('version')}")
+    flat = array("Q")
+    try:
+        flat.frombytes(zlib.decompress(body))
+    except zlib.error as e:
+        raise ValueError(str(e))
+    members = []
+    i = 0
+    while i < len(flat):
+        count = flat[i + 1]
+        members.append((flat[i], flat[i + 2:i + 2 + count]))
+        i += 2 + count
+    return header["guild_id"], header["saved_at"], members
+
+
+def load_all(guild_filter: Optional[Callable[[int], bool]] = None) -> int:
+    """Seed role_cache from every saved guild state. Returns how many were loaded."""
+    if not os.path.isdir(WARM_STATE_DIR):
+        return 0
+    loaded, oldest = 0, 0.0
+    started = time.perf_counter()
+    for name in os.listdir(WARM_STATE_DIR):
+        if not name.endswith(".state"):
+            continue
+        try:
+            with open(os.path.join(WARM_STATE_DIR, name), "rb") as f:
+                guild_id, saved_at, members = decode(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Skipping warm state {name}: {e}")
+            continue
+        if guild_filter is not None and not guild_filter(guild_id):
+            continue
+        if role_cache.load_warm_index(guild_id, members, saved_at):
+            loaded += 1
+            oldest = max(oldest, time.time() - saved_at)
+    if loaded:
+        print(f"Warm start: loaded {loaded} guilds in {time.perf_counter() - started:.2f}s, "
+              f"oldest snapshot {oldest / 60:.1f} minutes old")
+    return loaded
+
+
+def _write(guild_id: int, members: List[Tuple[int, Collection[int]]], saved_at: float) -> None:
+    os.makedirs(WARM_STATE_DIR, exist_ok=True)
+    path = _path(guild_id)
+    with open(path + ".tmp", "wb") as f:
+        f.write(encode(guild_id, members, saved_at))
+    os.replace(path + ".tmp", path)
+
+
+async def save_guilds(guild_ids: Iterable[int]) -> int:
+    """Save each guild whose index is live; encoding and writing run in a thread."""
+    saved = 0
+    for guild_id in guild_ids:
+        if role_cache.index_age(guild_id) is None or role_cache.warm_age(guild_id) is not None:
+            continue  # Incomplete, or still the old snapshot: keep the file as it is
+        members = role_cache.export_members(guild_id)
+        if members is None:
+            continue
+        await asyncio.to_thread(_write, guild_id, members, time.time())
+        saved += 1
+    return saved
+
+
+def forget(guild_id: int) -> None:
+    try:
+        os.remove(_path(guild_id))
+    except FileNotFoundError:
+        pass
+
+
+async def reconcile(bot) -> None:
+    """Replace snapshot data with live data, one guild at a time.
+
+    With the full member cache each warm guild is chunked in the background
+    and rebuilt; in lite mode the index is refetched on first use once it is
+    older than MEMBER_INDEX_TTL.
+    """
+    if COMPACT:
+        return
+    for guild in list(bot.guilds):
+        age = role_cache.warm_age(guild.id)
+        if age is None:
+            continue
+        try:
+            await role_cache.ensure_member_index(guild, allow_warm=False)
+        except discord.HTTPException as e:
+            print(f"Could not reconcile guild {guild.id}: {e}")
+            continue
+        print(f"Reconciled guild {guild.id} (snapshot was {age / 60:.1f} minutes old)")
+
+
+async def run(bot) -> None:
+    """Reconcile warm guilds, then save every guild every WARM_STATE_INTERVAL seconds."""
+    await reconcile(bot)
+    while True:
+        await asyncio.sleep(WARM_STATE_INTERVAL)
+        try:
+            await save_guilds([guild.id for guild in bot.guilds])
+        except OSError as e:
+            print(f"Could not save warm state: {e}")